@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+from config import Config
+
+class SemanticAnswerCache:
+    """Bounded cache of generated answers, matched by question similarity.
+
+    A stored answer is reused when a new question's embedding is within
+    Config.ANSWER_CACHE_THRESHOLD cosine similarity of a cached question and
+    retrieval returned exactly the same chunk IDs, i.e. the LLM would have
+    seen the same context. Least recently used answers are evicted first.
+
+    With a persist_path, entries are kept in an SQLite database, one row per
+    slot: storing an answer writes just that row, and the recency of cache
+    hits is written along with the next store.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, threshold: Optional[float] = None,
+                 persist_path: Optional[str] = None):
+        self.max_entries = max_entries or Config.ANSWER_CACHE_SIZE
+        self.threshold = Config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.persist_path = persist_path
+        self._vectors: Optional[np.ndarray] = None  # one row per slot
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # slot -> entry, LRU order
+        self._free_slots: List[int] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Recency counter persisted per row, so the LRU order survives restarts
+        self._clock = 0
+        self._touched: Dict[int, int] = {}  # slot -> last use, not yet written
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if self.persist_path:
+            self._open()
+
+    def lookup(self, embedding: List[float], chunk_ids: List[str]) -> Optional[Dict[str, Any]]:
+        """Return a cached answer for a near-duplicate question, if any."""
+        query = self._normalize(embedding)
+        chunk_key = tuple(chunk_ids)
+        with self._lock:
+            if self._entries and self._vectors is not None:
+                slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+                scores = self._vectors[slots] @ query
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = self._entries[int(slots[i])]
+                    if entry["chunk_ids"] == chunk_key:
+                        self._entries.move_to_end(int(slots[i]))
+                        self._clock += 1
+                        self._touched[int(slots[i])] = self._clock
+                        self.hits += 1
+                        return {
+                            "response": entry["response"],
+                            "sources": entry["sources"],
+                            "question": entry["question"],
+                            "similarity": float(scores[i])
+                        }
+            self.misses += 1
+            return None
+
+    def store(self, question: str, embedding: List[float], chunk_ids: List[str],
+              response: str, sources: List[Dict]):
+        """Remember a generated answer."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._free_slots = list(range(self.max_entries - 1, -1, -1))
+            if not self._free_slots:
+                evicted_slot, _ = self._entries.popitem(last=False)
+                self._free_slots.append(evicted_slot)
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {
+                "question": question,
+                "chunk_ids": tuple(chunk_ids),
+                "response": response,
+                "sources": sources
+            }
+            self._clock += 1
+            self._touched.pop(slot, None)
+            if self._conn is not None:
+                self._save(slot)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            self._free_slots = []
+            self._touched.clear()
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM answers")
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Error clearing answer cache {self.persist_path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _open(self):
+        db_dir = os.path.dirname(self.persist_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        try:
+            self._conn = sqlite3.connect(self.persist_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "slot INTEGER PRIMARY KEY, question TEXT NOT NULL, chunk_ids TEXT NOT NULL, "
+                "response TEXT NOT NULL, sources TEXT NOT NULL, vector BLOB NOT NULL, "
+                "last_used INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+            self._load()
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error opening answer cache {self.persist_path}: {e}")
+            self._conn = None
+            self._entries.clear()
+            self._vectors = None
+            self._free_slots = []
+
+    def _save(self, slot: int):
+        """Write one slot's entry, plus the recency of entries hit since the last write."""
+        entry = self._entries[slot]
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers "
+                    "(slot, question, chunk_ids, response, sources, vector, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (slot, entry["question"], json.dumps(list(entry["chunk_ids"])), entry["response"],
+                     json.dumps(entry["sources"]), self._vectors[slot].tobytes(), self._clock)
+                )
+                if self._touched:
+                    self._conn.executemany("UPDATE answers SET last_used = ? WHERE slot = ?",
+                                           [(used, touched) for touched, used in self._touched.items()])
+            self._touched.clear()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Error saving answer cache {self.persist_path}: {e}")
+
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT slot, question, chunk_ids, response, sources, vector, last_used "
+            "FROM answers ORDER BY last_used"
+        ).fetchall()
+        if not rows:
+            return
+        # Keep the most recently used entries if the cache has shrunk
+        dropped, rows = rows[:-self.max_entries], rows[-self.max_entries:]
+        self._conn.executemany("DELETE FROM answers WHERE slot = ?", [(row[0],) for row in dropped])
+        # Slots beyond a shrunk cache move to free ones
+        taken = {row[0] for row in rows if row[0] < self.max_entries}
+        open_slots = iter(slot for slot in range(self.max_entries) if slot not in taken)
+        dim = len(rows[0][5]) // np.dtype(np.float32).itemsize
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        for slot, question, chunk_ids, response, sources, vector, _ in rows:
+            if slot >= self.max_entries:
+                new_slot = next(open_slots)
+                self._conn.execute("UPDATE answers SET slot = ? WHERE slot = ?", (new_slot, slot))
+                slot = new_slot
+            self._vectors[slot] = np.frombuffer(vector, dtype=np.float32)
+            self._entries[slot] = {
+                "question": question,
+                "chunk_ids": tuple(json.loads(chunk_ids)),
+                "response": response,
+                "sources": json.loads(sources)
+            }
+        self._conn.commit()
+        self._clock = rows[-1][6]
+        self._free_slots = sorted(set(range(self.max_entries)) - set(self._entries), reverse=True)
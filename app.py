@@ -1,13 +1,95 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context, g
 from rag_pipeline import RAGPipeline
+from llm_pool import QueueFullError
+from job_manager import JobManager, FINISHED_STATUSES
+from metadata_filters import build_where
 from datetime import datetime
 import json
 import os
+import threading
+import uuid
 from config import Config
 
 app = Flask(__name__)
 rag_pipeline = RAGPipeline()
 
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+def _get_ingestor():
+    """The app's DataIngestor, shared by the document watcher and ingestion jobs."""
+    global _ingestor
+    with _ingestor_lock:
+        if _ingestor is None:
+            from ingest_data import DataIngestor
+            _ingestor = DataIngestor()
+        return _ingestor
+
+def _run_query_job(params: dict, report_progress) -> dict:
+    # Jobs submitted during warm-up start once the indexes are warm
+    rag_pipeline.ready.wait()
+    questions = params['questions']
+    results = []
+    for result in rag_pipeline.query_batch_iter(questions):
+        results.append(result)
+        report_progress(answered=len(results), total=len(questions))
+    return {'results': sorted(results, key=lambda result: result['index'])}
+
+def _run_ingest_job(params: dict, report_progress) -> dict:
+    rag_pipeline.ready.wait()
+    ingestor = _get_ingestor()
+    # Waits for any watcher sync in progress
+    with ingestor.lock:
+        ingestor.progress = report_progress
+        try:
+            # Serial extraction: forking this threaded process (with the models
+            # loaded) for a process pool can deadlock and copies its whole memory
+            count = ingestor.process_documents(workers=1, force=params.get('force', False))
+        finally:
+            ingestor.progress = None
+        return {'sources_indexed': count, **ingestor.progress_snapshot()}
+
+job_manager = JobManager()
+job_manager.register('query', _run_query_job)
+job_manager.register('ingest', _run_ingest_job)
+document_watcher = None
+
+def _start_background_work():
+    """Warm up the pipeline, then resume queued jobs and start the document watcher.
+    
+    Nothing runs queries or ingestion until the indexes are warm, so resumed
+    jobs do not hit cold caches.
+    """
+    global document_watcher
+    if not rag_pipeline.ready.is_set():
+        rag_pipeline.warm_up()
+    job_manager.resume()
+    if Config.WATCH_DOCUMENTS:
+        # Index new evidence documents in-process so queries see them without a restart
+        from document_watcher import DocumentWatcher
+        document_watcher = DocumentWatcher(_get_ingestor(), workers=1)  # no process pool in-app, see above
+        document_watcher.start()
+
+# Load indexes and run synthetic queries in the background; /api/ready reports when done
+threading.Thread(target=_start_background_work, name='rag-warmup', daemon=True).start()
+
+SESSION_COOKIE = 'forensics_session'
+
+def _session_id() -> str:
+    """Return the caller's conversation session id, issuing one if needed."""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = g.get('new_session_id') or uuid.uuid4().hex
+        g.new_session_id = session_id
+    return session_id
+
+@app.after_request
+def _set_session_cookie(response):
+    if g.get('new_session_id'):
+        response.set_cookie(SESSION_COOKIE, g.new_session_id, httponly=True, samesite='Lax',
+                            max_age=Config.SESSION_TTL_SECONDS)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -21,21 +103,235 @@ def ask_question():
         if not question:
             return jsonify({'error': 'Question is required'}), 400
         
-        response, sources = rag_pipeline.query(question)
+        filters = data.get('filters')
+        try:
+            build_where(filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response, sources, cached = rag_pipeline.query(question, _session_id(), filters)
         
         return jsonify({
             'response': response,
             'sources': sources,
+            'cached': cached,
             'timestamp': datetime.now().isoformat()
         })
         
+    except QueueFullError as e:
+        return _queue_full(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ask_stream', methods=['POST'])
+def ask_question_stream():
+    """Answer a question as Server-Sent Events: sources first, then tokens, then the final response."""
+    data = request.get_json(silent=True) or {}
+    question = data.get('question', '').strip()
+    
+    if not question:
+        return jsonify({'error': 'Question is required'}), 400
+    
+    filters = data.get('filters')
+    try:
+        build_where(filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    events = rag_pipeline.query_stream(question, _session_id(), filters)
+    try:
+        # Reserve an LLM worker before committing to a streaming response
+        first_event = next(events)
+    except QueueFullError as e:
+        return _queue_full(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        try:
+            yield _sse(first_event['type'], first_event)
+            for event in events:
+                if event['type'] == 'done':
+                    event['timestamp'] = datetime.now().isoformat()
+                yield _sse(event['type'], event)
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+        finally:
+            events.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/ask_batch', methods=['POST'])
+def ask_batch():
+    """Answer many independent questions in one call.
+    
+    Returns one JSON document, or with "stream": true, Server-Sent Events with
+    a "result" per question as answers complete and a final "done".
+    """
+    data = request.get_json(silent=True) or {}
+    questions = data.get('questions')
+    
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'error': 'Questions are required'}), 400
+    questions = [str(question).strip() for question in questions]
+    if not all(questions):
+        return jsonify({'error': 'Questions must not be empty'}), 400
+    if len(questions) > Config.MAX_BATCH_QUESTIONS:
+        return jsonify({'error': f'At most {Config.MAX_BATCH_QUESTIONS} questions per batch'}), 400
+    
+    if not data.get('stream'):
+        try:
+            results = rag_pipeline.query_batch(questions)
+            return jsonify({'results': results, 'timestamp': datetime.now().isoformat()})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        events = rag_pipeline.query_batch_iter(questions)
+        try:
+            for result in events:
+                yield _sse('result', result)
+            yield _sse('done', {'count': len(questions), 'timestamp': datetime.now().isoformat()})
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+        finally:
+            events.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Start a background job and return its id (202).
+    
+    Body: {"type": "query", "question": "..."} (or "questions": [...]) or
+    {"type": "ingest", "force": false}. Poll /api/jobs/<id> or subscribe to
+    /api/jobs/<id>/events for progress and the result.
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('type')
+    
+    if kind == 'query':
+        questions = data.get('questions') or ([data['question']] if data.get('question') else [])
+        if not isinstance(questions, list):
+            return jsonify({'error': 'Questions must be a list'}), 400
+        questions = [str(question).strip() for question in questions]
+        if not questions or not all(questions):
+            return jsonify({'error': 'Question is required'}), 400
+        if len(questions) > Config.MAX_BATCH_QUESTIONS:
+            return jsonify({'error': f'At most {Config.MAX_BATCH_QUESTIONS} questions per job'}), 400
+        params = {'questions': questions}
+    elif kind == 'ingest':
+        params = {'force': bool(data.get('force', False))}
+    else:
+        return jsonify({'error': "Job type must be 'query' or 'ingest'"}), 400
+    
+    try:
+        job = job_manager.submit(kind, params)
+    except QueueFullError as e:
+        return _queue_full(e)
+    return jsonify(job), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'jobs': job_manager.list_jobs(limit)})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id: str):
+    """Server-Sent Events: a "progress" event on every change and a final "done"."""
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        while True:
+            version = job_manager.version(job_id)
+            job = job_manager.get(job_id)
+            if job is None:
+                break
+            if job['status'] in FINISHED_STATUSES:
+                yield _sse('done', job)
+                break
+            yield _sse('progress', job)
+            # Re-sends the current state as a keep-alive if nothing changes
+            job_manager.wait_for_change(job_id, version, timeout=15)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _page_label(source: dict) -> str:
+    start, end = source['page_start'], source.get('page_end', source['page_start'])
+    return f"p. {start}" if start == end else f"pp. {start}-{end}"
+
+def _queue_full(error: QueueFullError):
+    """Backpressure response when every LLM worker is busy and the queue is full."""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '5'
+    return response, 429
+
+@app.route('/api/chunk_window', methods=['GET'])
+def chunk_window():
+    """Neighbouring chunks around a cited chunk, for expanding a source reference."""
+    source = request.args.get('source', '')
+    if not source:
+        return jsonify({'error': 'No source provided'}), 400
+    try:
+        chunk_index = request.args.get('chunk_index', type=int)
+        radius = min(request.args.get('radius', 1, type=int), 10)
+        if chunk_index is None:
+            return jsonify({'error': 'No chunk_index provided'}), 400
+        chunks = rag_pipeline.get_chunk_window(source, chunk_index, radius)
+        return jsonify({'source': source, 'chunks': chunks})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/facets', methods=['GET'])
+def facets():
+    """Sources, file types, tags and ingestion dates that /api/ask can filter on."""
+    try:
+        return jsonify(rag_pipeline.facets())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({**rag_pipeline.metrics(), 'jobs': job_manager.stats()})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    body = {
+        'ready': rag_pipeline.ready.is_set(),
+        'warmup_seconds': rag_pipeline.warmup_seconds,
+        'warmup_error': rag_pipeline.warmup_error
+    }
+    return jsonify(body), 200 if body['ready'] else 503
+
 @app.route('/api/clear', methods=['POST'])
 def clear_conversation():
     try:
-        rag_pipeline.clear_conversation()
+        rag_pipeline.clear_conversation(_session_id())
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -55,7 +351,10 @@ def export_conversation():
             if 'sources' in msg and msg['sources']:
                 export_content += "Sources:\n"
                 for source in msg['sources']:
-                    export_content += f"  - {source['source']} (Chunk {source['chunk_index']})\n"
+                    location = f"Chunk {source['chunk_index']}"
+                    if source.get('page_start'):
+                        location += f", {_page_label(source)}"
+                    export_content += f"  - {source['source']} ({location})\n"
             export_content += f"Timestamp: {msg.get('timestamp', 'N/A')}\n"
             export_content += "-" * 40 + "\n"
         
@@ -72,4 +371,7 @@ def export_conversation():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    if not rag_pipeline.ready.is_set():
+        print("Warming up indexes...")
+        rag_pipeline.ready.wait()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
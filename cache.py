@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from config import Config
+
+GENERATION_FILE = "index_generation"
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional TTL and hit/miss counters."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and time.monotonic() - entry[1] > self.ttl):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+def normalize_query(text: str) -> str:
+    """Cache key for a question: case- and whitespace-insensitive."""
+    return " ".join(text.lower().split())
+
+_generation_lock = threading.Lock()
+_generation_seen = (None, 0)  # ((inode, mtime_ns), value)
+
+def _generation_path() -> str:
+    return os.path.join(Config.VECTOR_DB_PATH, GENERATION_FILE)
+
+def get_index_generation() -> int:
+    """Current ingestion generation; changes whenever the collection is written.
+
+    Only re-reads the marker file when it has been replaced, so this is cheap
+    enough to call on every query.
+    """
+    global _generation_seen
+    try:
+        stat = os.stat(_generation_path())
+    except OSError:
+        return 0
+    marker = (stat.st_ino, stat.st_mtime_ns)
+    with _generation_lock:
+        if _generation_seen[0] != marker:
+            try:
+                with open(_generation_path(), 'r') as f:
+                    value = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                value = 0
+            _generation_seen = (marker, value)
+        return _generation_seen[1]
+
+def bump_index_generation() -> int:
+    """Mark the collection as changed so query-side caches are invalidated."""
+    with _generation_lock:
+        path = _generation_path()
+        try:
+            with open(path, 'r') as f:
+                value = int(f.read().strip() or 0) + 1
+        except (OSError, ValueError):
+            value = 1
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(value))
+        os.replace(tmp_path, path)
+        return value
@@ -6,18 +6,132 @@ load_dotenv()
 class Config:
     # Model settings
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
     LLM_MODEL_PATH = os.getenv("LLM_MODEL_PATH", "./models/phi-3-mini-4k-instruct-q4.gguf")
     
+    # LLM worker pool (each worker holds its own model handle)
+    LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+    LLM_THREADS_PER_WORKER = int(os.getenv("LLM_THREADS_PER_WORKER", "4"))
+    LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "8"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))
+    PROMPT_PREFIX_CACHE = os.getenv("PROMPT_PREFIX_CACHE", "true").lower() == "true"
+    
+    # Web server
+    SERVER_THREADS = int(os.getenv("SERVER_THREADS", "8"))
+    
     # Vector database
     VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./data/vector_db")
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "cyber_forensics_docs")
     
+    # Vector store: "chroma" or "numpy" (local flat/IVF index); copy data over with vector_store.py --from/--to
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+    # HNSW parameters of the Chroma collection; all are fixed when it is created
+    HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")  # "l2", "cosine" or "ip"
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "10"))  # raise for better recall at some latency cost
+    NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", os.path.join(VECTOR_DB_PATH, "numpy"))
+    NUMPY_INDEX = os.getenv("NUMPY_INDEX", "flat")  # or "ivf"
+    IVF_LISTS = int(os.getenv("IVF_LISTS", "0"))  # 0 = about 4 * sqrt(chunks)
+    IVF_PROBES = int(os.getenv("IVF_PROBES", "16"))  # lists scanned per query
+    IVF_MIN_TRAIN_SIZE = int(os.getenv("IVF_MIN_TRAIN_SIZE", "10000"))  # smaller stores stay flat
+    
+    # Vector search: "chroma" searches the vector store; "quantized" a compact int8/float16 copy, rescored in float32
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "chroma")
+    QUANTIZED_DTYPE = os.getenv("QUANTIZED_DTYPE", "int8")  # or "float16"
+    QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "4"))  # float32-rescored candidates per result
+    
+    # Conversation sessions
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" or "sqlite"
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./data/sessions.db")
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+    SESSION_MEMORY_LIMIT_MB = float(os.getenv("SESSION_MEMORY_LIMIT_MB", "64"))
+    MAX_HISTORY_TOKENS = int(os.getenv("MAX_HISTORY_TOKENS", "1000"))
+    
     # RAG settings
     CHUNK_SIZE = 800
     CHUNK_OVERLAP = 100
+    # "tokens" packs sentences up to the embedding model's token limit; "chars" uses CHUNK_SIZE
+    CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "tokens")
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))  # all-MiniLM-L6-v2 max_seq_length
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
     TOP_K_RESULTS = 3
     MAX_CONTEXT_LENGTH = 4000
     
+    # Hybrid retrieval: BM25 lexical index fused with vector search (reciprocal-rank fusion)
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+    VECTOR_WEIGHT = float(os.getenv("VECTOR_WEIGHT", "1.0"))
+    BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", "1.0"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per retriever, before fusion
+    BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+    BM25_DELTA_LIMIT = int(os.getenv("BM25_DELTA_LIMIT", "1000000"))  # postings before compaction
+    
+    # Optional cross-encoder re-ranking of a larger candidate set
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+    RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "500"))
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    
+    # Background jobs (/api/jobs)
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./data/jobs.db")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+    JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    
+    # URL ingestion (urls.txt)
+    URL_FETCH_WORKERS = int(os.getenv("URL_FETCH_WORKERS", "8"))
+    URL_FETCH_PER_HOST = int(os.getenv("URL_FETCH_PER_HOST", "2"))  # concurrent requests per site
+    URL_FETCH_TIMEOUT = float(os.getenv("URL_FETCH_TIMEOUT", "10"))
+    URL_FETCH_RETRIES = int(os.getenv("URL_FETCH_RETRIES", "3"))
+    URL_FETCH_BACKOFF = float(os.getenv("URL_FETCH_BACKOFF", "0.5"))  # seconds, doubled per retry
+    URL_CACHE_DIR = os.getenv("URL_CACHE_DIR", "./data/url_cache")
+    HTML_PARSER = os.getenv("HTML_PARSER", "auto")  # "auto" uses lxml when installed, or "html.parser"
+    
+    # Startup warm-up: load the indexes and run synthetic queries before reporting ready (/api/ready)
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+    WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", "3"))
+    
+    # /api/ask_batch
+    MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "100"))
+    
+    # Prompt token budget (within MAX_CONTEXT_LENGTH, the model's n_ctx)
+    MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "512"))  # reserved for the answer
+    PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.25"))  # of the space after system text
+    PROMPT_SAFETY_TOKENS = int(os.getenv("PROMPT_SAFETY_TOKENS", "16"))
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+    
+    # Query-side caches
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "512"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+    
+    # Semantic answer cache (reuses answers for paraphrased questions)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_PERSIST = os.getenv("ANSWER_CACHE_PERSIST", "false").lower() == "true"
+    # Answers depend on the conversation, so by default only standalone questions are cached
+    ANSWER_CACHE_WITH_HISTORY = os.getenv("ANSWER_CACHE_WITH_HISTORY", "false").lower() == "true"
+    
+    # Ingestion pipeline
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "1"))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))  # chunks per embed/write batch
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+    INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "5"))  # max wait before a partial batch is written
+    # Page-range processes for a single large PDF in serial ingestion
+    PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", "4"))
+    
+    # Watch mode: keep the index in sync with DATA_DIR while running
+    WATCH_DOCUMENTS = os.getenv("WATCH_DOCUMENTS", "false").lower() == "true"  # inside the web app
+    WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "5"))
+    WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "2"))
+    WATCH_WORKERS = int(os.getenv("WATCH_WORKERS", "1"))
+    
     # File paths
     DATA_DIR = os.getenv("DATA_DIR", "./data/documents")
     
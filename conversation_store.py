@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+from llm_model import LocalLLM, ConversationManager
+from config import Config
+
+class ConversationStore:
+    """In-memory, session-keyed conversation histories.
+
+    Sessions are kept in LRU order and evicted when they have been idle longer
+    than the TTL, when there are more than max_sessions, or when the combined
+    history size exceeds the memory cap. Each history is still trimmed to
+    Config.MAX_HISTORY_TOKENS by its ConversationManager.
+    """
+
+    def __init__(self, llm: LocalLLM):
+        self.llm = llm
+        self.ttl = Config.SESSION_TTL_SECONDS
+        self.max_sessions = Config.MAX_SESSIONS
+        self.memory_limit = int(Config.SESSION_MEMORY_LIMIT_MB * 1024 * 1024)
+        self._sessions: "OrderedDict[str, Tuple[ConversationManager, float]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_size = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get_context(self, session_id: str) -> str:
+        """Get formatted conversation context for a session."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._sessions.get(session_id)
+            if not entry:
+                return ""
+            self._touch(session_id, entry[0])
+        return entry[0].get_conversation_context()
+
+    def get_messages(self, session_id: str) -> List[Dict[str, str]]:
+        """Get the raw message history for a session."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._sessions.get(session_id)
+            if not entry:
+                return []
+            self._touch(session_id, entry[0])
+        return entry[0].get_messages()
+
+    def add_exchange(self, session_id: str, question: str, response: str):
+        """Record a question/answer pair in a session's history.
+
+        The session is looked up or created, and the pair appended, in one
+        critical section, so concurrent first requests for a session share a
+        single history and neither exchange is lost.
+        """
+        with self._lock:
+            manager = self._sessions.setdefault(
+                session_id, (ConversationManager(self.llm), time.monotonic())
+            )[0]
+            self._touch(session_id, manager)
+            manager.add_message("user", question)
+            manager.add_message("assistant", response)
+            size = manager.memory_size()
+            self._total_size += size - self._sizes.get(session_id, 0)
+            self._sizes[session_id] = size
+            self._enforce_limits()
+
+    def clear(self, session_id: str):
+        """Forget a single session."""
+        with self._lock:
+            self._remove(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "memory_bytes": self._total_size,
+                "evictions": self._evictions
+            }
+
+    def _touch(self, session_id: str, manager: ConversationManager):
+        self._sessions[session_id] = (manager, time.monotonic())
+        self._sessions.move_to_end(session_id)
+
+    def _remove(self, session_id: str):
+        if self._sessions.pop(session_id, None) is not None:
+            self._total_size -= self._sizes.pop(session_id, 0)
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if last_access >= cutoff:
+                break
+            self._remove(session_id)
+            self._evictions += 1
+
+    def _enforce_limits(self):
+        self._evict_expired()
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self._total_size > self.memory_limit):
+            # Oldest entry is first in LRU order
+            self._remove(next(iter(self._sessions)))
+            self._evictions += 1
+
+class SQLiteConversationStore:
+    """On-disk conversation histories, so sessions survive restarts.
+
+    Uses the same TTL, session cap and per-session token budget as
+    ConversationStore; the memory cap does not apply since nothing is held
+    in RAM between requests.
+    """
+
+    def __init__(self, llm: LocalLLM, db_path: str = None):
+        self.llm = llm
+        self.ttl = Config.SESSION_TTL_SECONDS
+        self.max_sessions = Config.MAX_SESSIONS
+        self.db_path = db_path or Config.SESSION_DB_PATH
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)"
+        )
+        self._conn.commit()
+
+    def get_context(self, session_id: str) -> str:
+        """Get formatted conversation context for a session."""
+        return self._manager(self.get_messages(session_id)).get_conversation_context()
+
+    def get_messages(self, session_id: str) -> List[Dict[str, str]]:
+        """Get the raw message history for a session."""
+        with self._lock:
+            return self._read_messages(session_id)
+
+    def add_exchange(self, session_id: str, question: str, response: str):
+        """Record a question/answer pair in a session's history.
+
+        The history is read and written back in one IMMEDIATE transaction, so
+        concurrent exchanges for a session (from other threads or processes
+        sharing the database) cannot overwrite each other.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                manager = self._manager(self._read_messages(session_id))
+                manager.add_message("user", question)
+                manager.add_message("assistant", response)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, messages, last_access) VALUES (?, ?, ?)",
+                    (session_id, json.dumps(manager.get_messages()), time.time())
+                )
+                self._enforce_limits()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def clear(self, session_id: str):
+        """Forget a single session."""
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": count,
+            "evictions": self._evictions
+        }
+
+    def _read_messages(self, session_id: str) -> List[Dict[str, str]]:
+        row = self._conn.execute(
+            "SELECT messages, last_access FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if not row or row[1] < time.time() - self.ttl:
+            return []
+        return json.loads(row[0])
+
+    def _manager(self, messages: List[Dict[str, str]]) -> ConversationManager:
+        return ConversationManager(self.llm, history=messages)
+
+    def _enforce_limits(self):
+        cursor = self._conn.execute(
+            "DELETE FROM sessions WHERE last_access < ?", (time.time() - self.ttl,)
+        )
+        self._evictions += max(cursor.rowcount, 0)
+        cursor = self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+        self._evictions += max(cursor.rowcount, 0)
+
+def create_conversation_store(llm: LocalLLM):
+    """Build the conversation store selected by Config.SESSION_STORE."""
+    if Config.SESSION_STORE == "sqlite":
+        return SQLiteConversationStore(llm)
+    return ConversationStore(llm)
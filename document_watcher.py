@@ -0,0 +1,135 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from config import Config
+
+try:
+    # Optional: inotify/FSEvents notifications instead of polling
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, changed: threading.Event):
+        self.changed = changed
+
+    def on_any_event(self, event):
+        self.changed.set()
+
+class DocumentWatcher:
+    """Keeps the collection in sync with Config.DATA_DIR as files come and go.
+
+    Uses watchdog notifications when the package is installed and falls back
+    to polling file sizes and mtimes otherwise. Bursts of changes (e.g. a copy
+    of many reports) are debounced into a single incremental sync, which goes
+    through the ingestion manifest so only added, modified or deleted files
+    are touched.
+    """
+
+    def __init__(self, ingestor, poll_interval: Optional[float] = None,
+                 debounce_seconds: Optional[float] = None, workers: Optional[int] = None):
+        self.ingestor = ingestor
+        self.poll_interval = poll_interval or Config.WATCH_POLL_INTERVAL
+        self.debounce_seconds = debounce_seconds or Config.WATCH_DEBOUNCE_SECONDS
+        self.workers = workers or Config.WATCH_WORKERS
+        self.urls_file = os.path.join(Config.DATA_DIR, "urls.txt")
+        self._stop = threading.Event()
+        self._changed = threading.Event()
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._urls_stat: Optional[Tuple[int, int]] = None
+
+    def start(self) -> threading.Thread:
+        """Run the watcher in a background thread."""
+        self._thread = threading.Thread(target=self.run, name="document-watcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._changed.set()
+        if self._observer:
+            self._observer.stop()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def run(self):
+        """Watch loop; blocks until stop() is called."""
+        os.makedirs(Config.DATA_DIR, exist_ok=True)
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_ChangeHandler(self._changed), Config.DATA_DIR, recursive=True)
+            self._observer.start()
+            print(f"Watching {Config.DATA_DIR} for changes (filesystem events)")
+        else:
+            print(f"Watching {Config.DATA_DIR} for changes (polling every {self.poll_interval}s)")
+
+        self._snapshot = self._scan()
+        # urls.txt is only re-fetched once it changes after startup
+        self._urls_stat = self._stat(self.urls_file)
+        self.sync()
+
+        while not self._stop.is_set():
+            self._wait(self.poll_interval)
+            if self._stop.is_set() or not self._detect_change():
+                continue
+            # Debounce: wait until the directory has been quiet for a while
+            while not self._stop.wait(self.debounce_seconds) and self._detect_change():
+                pass
+            if not self._stop.is_set():
+                self.sync()
+
+    def sync(self):
+        """Incrementally index added/modified files and purge deleted ones.
+
+        Holds the ingestor's lock for the whole pass (scan, index, purge,
+        save), so ingestion jobs sharing the ingestor never interleave with it.
+        """
+        try:
+            with self.ingestor.lock:
+                count = self.ingestor.sync_files(workers=self.workers)
+                urls_stat = self._stat(self.urls_file)
+                if urls_stat != self._urls_stat:
+                    self._urls_stat = urls_stat
+                    if urls_stat is not None:
+                        count += self.ingestor.process_urls_file(self.urls_file)
+                self.ingestor.save()
+            if count:
+                print(f"Watch sync indexed {count} sources")
+        except Exception as e:
+            print(f"Error syncing documents: {e}")
+
+    def _wait(self, timeout: float):
+        if self._observer:
+            self._changed.wait(timeout)
+        else:
+            self._stop.wait(timeout)
+
+    def _detect_change(self) -> bool:
+        if self._observer:
+            changed = self._changed.is_set()
+            self._changed.clear()
+            return changed
+        snapshot = self._scan()
+        changed = snapshot != self._snapshot
+        self._snapshot = snapshot
+        return changed
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for file_path in self.ingestor.discover_files() + [self.urls_file]:
+            stat = self._stat(file_path)
+            if stat is not None:
+                snapshot[file_path] = stat
+        return snapshot
+
+    @staticmethod
+    def _stat(file_path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,51 @@
+import threading
+from typing import List, Optional
+from sentence_transformers import SentenceTransformer
+from config import Config
+
+class EmbeddingService:
+    """Single loaded embedding model shared by queries, ingestion and Chroma.
+
+    Instances are callable with a list of texts, which makes them usable as a
+    Chroma embedding function, so collections do not load a second copy of
+    the model.
+    """
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self.model = SentenceTransformer(self.model_name)
+        self.batch_size = Config.EMBEDDING_BATCH_SIZE
+
+    def encode_queries(self, queries: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """Embed search queries in batches."""
+        return self._encode(queries, batch_size)
+
+    def encode_documents(self, documents: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """Embed document chunks in batches."""
+        return self._encode(documents, batch_size)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        # Chroma embedding function protocol
+        return self.encode_documents(list(input))
+
+    def _encode(self, texts: List[str], batch_size: Optional[int]) -> List[List[float]]:
+        if not texts:
+            return []
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return embeddings.tolist()
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide embedding service, loading the model on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService()
+        return _service
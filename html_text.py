@@ -0,0 +1,191 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Union
+from config import Config
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Elements whose content is never page text
+SKIP_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "iframe",
+    "nav", "footer", "header", "aside"
+})
+SKIP_ROLES = frozenset({"navigation", "banner", "contentinfo", "complementary", "search"})
+VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr"
+})
+BLOCK_TAGS = frozenset({
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre",
+    "section", "table", "td", "th", "tr", "ul"
+})
+# Lists that are mostly link text are menus, tag clouds and "related" blocks
+LINK_LIST_TAGS = frozenset({"ul", "ol", "dl"})
+LINK_DENSITY_LIMIT = 0.8
+# Main-content containers, in order of preference
+CONTENT_KINDS = ("main", "article", "content")
+
+class _Frame:
+    __slots__ = ("tag", "skip", "kind", "start", "text_len", "link_len")
+
+    def __init__(self, tag: str, skip: bool, kind: Optional[str], start: int, text_len: int, link_len: int):
+        self.tag = tag
+        self.skip = skip
+        self.kind = kind
+        self.start = start
+        self.text_len = text_len
+        self.link_len = link_len
+
+class TextCollector:
+    """Parser target that turns an HTML event stream into page text in one pass.
+
+    Boilerplate (scripts, navigation, headers/footers, ARIA landmark roles
+    and link-heavy lists) is dropped as it streams past instead of being
+    removed from a tree first. The spans of the first <main>, <article> and
+    <div class="content"> are remembered, so the main content can be picked
+    at the end without walking the document again. Usable as an lxml parser
+    target (start/end/data/close) or driven by the stdlib parser.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.stack: List[_Frame] = []
+        self.spans: Dict[str, List[Optional[int]]] = {}
+        self.skipping = 0
+        self.links = 0
+        self.text_len = 0
+        self.link_len = 0
+
+    def start(self, tag: str, attrib) -> None:
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self.parts.append(" ")
+        if tag in VOID_TAGS:
+            return
+        skip = (tag in SKIP_TAGS or attrib.get("role") in SKIP_ROLES
+                or "hidden" in attrib or attrib.get("aria-hidden") == "true")
+        kind = None
+        if not skip and not self.skipping:
+            if tag == "main" or attrib.get("role") == "main":
+                kind = "main"
+            elif tag == "article":
+                kind = "article"
+            elif tag == "div" and "content" in (attrib.get("class") or "").split():
+                kind = "content"
+            if kind in self.spans:
+                kind = None  # only the first of each kind counts
+            elif kind:
+                self.spans[kind] = [len(self.parts), None]
+        self.stack.append(_Frame(tag, skip, kind, len(self.parts), self.text_len, self.link_len))
+        if skip:
+            self.skipping += 1
+        if tag == "a":
+            self.links += 1
+
+    def end(self, tag: str) -> None:
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self.parts.append(" ")
+        # Close the matching element and anything left unclosed inside it
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].tag == tag:
+                while len(self.stack) > i:
+                    self._close(self.stack.pop())
+                return
+
+    def data(self, text: str) -> None:
+        if self.skipping:
+            return
+        self.parts.append(text)
+        length = len(text.strip())
+        self.text_len += length
+        if self.links:
+            self.link_len += length
+
+    def close(self) -> str:
+        while self.stack:
+            self._close(self.stack.pop())
+        for kind in CONTENT_KINDS:
+            span = self.spans.get(kind)
+            if span:
+                text = " ".join("".join(self.parts[span[0]:span[1]]).split())
+                if text:
+                    return text
+        return " ".join("".join(self.parts).split())
+
+    def _close(self, frame: _Frame) -> None:
+        if frame.skip:
+            self.skipping -= 1
+        if frame.tag == "a":
+            self.links -= 1
+        if frame.kind:
+            self.spans[frame.kind][1] = len(self.parts)
+        if frame.tag in LINK_LIST_TAGS and not self.skipping:
+            text_len = self.text_len - frame.text_len
+            link_len = self.link_len - frame.link_len
+            if text_len and link_len / text_len >= LINK_DENSITY_LIMIT:
+                del self.parts[frame.start:]
+                self.text_len = frame.text_len
+                self.link_len = frame.link_len
+                # A content span that started inside the dropped list is gone too
+                for kind, span in list(self.spans.items()):
+                    if span[0] > frame.start:
+                        del self.spans[kind]
+                    elif span[1] is not None and span[1] > frame.start:
+                        span[1] = frame.start
+
+class _StdlibParser(HTMLParser):
+    """Feeds the stdlib tokenizer's events into a TextCollector."""
+
+    def __init__(self, target: TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+def _decode(content: Union[bytes, str], encoding: Optional[str] = None) -> str:
+    if isinstance(content, str):
+        return content
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode(encoding or "latin-1", errors="replace")
+
+def html_to_text(content: Union[bytes, str], encoding: Optional[str] = None) -> str:
+    """Extract the readable main text of an HTML page with whitespace collapsed.
+
+    Uses lxml's C parser when it is installed (and HTML_PARSER allows it),
+    otherwise the stdlib html.parser; both drive the same single-pass
+    TextCollector.
+    """
+    text = _decode(content, encoding)
+    if not text.strip():
+        return ""
+    collector = TextCollector()
+    if etree is not None and Config.HTML_PARSER != "html.parser":
+        parser = etree.HTMLParser(target=collector)
+        try:
+            parser.feed(text)
+            return parser.close()
+        except etree.LxmlError as e:
+            print(f"lxml could not parse page, falling back to html.parser: {e}")
+            collector = TextCollector()
+    parser = _StdlibParser(collector)
+    parser.feed(text)
+    parser.close()
+    return collector.close()
@@ -129,154 +129,435 @@
 
 import os
 import glob
-from typing import List, Dict, Any
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
+import argparse
+import threading
+import time
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Optional, Callable
+from embedding_service import get_embedding_service
+from cache import bump_index_generation
+from ingest_manifest import IngestManifest, file_fingerprint, text_fingerprint
+from ingest_pipeline import IngestionPipeline, WriteBuffer
+from lexical_index import LexicalIndex
+from metadata_filters import source_metadata
+from quantized_store import QuantizedVectorStore
+from vector_store import create_vector_store
+from token_chunker import get_chunker
+from url_fetcher import UrlFetcher
 from utils import *
 from config import Config
 
 class DataIngestor:
     def __init__(self):
-        self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
-        self.client = PersistentClient(path=Config.VECTOR_DB_PATH)
-        self.collection = self.client.get_or_create_collection(
-            name=Config.COLLECTION_NAME,
-            embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=Config.EMBEDDING_MODEL
-            )
-        )
+        self.embeddings = get_embedding_service()
+        self.vector_store = create_vector_store(embedding_function=self.embeddings)
+        self.manifest = IngestManifest()
+        self.lexical_index = LexicalIndex()
+        # Compact copy of the vectors for SEARCH_BACKEND=quantized
+        self.quantized_store = QuantizedVectorStore() if Config.SEARCH_BACKEND == "quantized" else None
+        # Batches chunks of the serial path across sources (see WriteBuffer)
+        self.write_buffer = WriteBuffer(self)
+        # Serializes ingestion runs (CLI, watcher and web jobs can share one ingestor)
+        self.lock = threading.RLock()
+        # Optional callback receiving progress_snapshot() fields as ingestion advances
+        self.progress: Optional[Callable[..., None]] = None
+        self._progress_lock = threading.Lock()
+        self.reset_progress()
+        if len(self.lexical_index) != self.vector_store.count():
+            # Missing, or out of step after an interrupted run
+            self.rebuild_lexical_index()
+        if self.quantized_store is not None and (
+                len(self.quantized_store) != self.vector_store.count()
+                or self.quantized_store.dtype != Config.QUANTIZED_DTYPE):
+            self.rebuild_quantized_store()
     
-    def process_documents(self) -> int:
-        """Process all documents in the data directory."""
+    def process_documents(self, workers: Optional[int] = None, force: bool = False) -> int:
+        """Process all documents in the data directory.
+        
+        Only new or changed sources are re-indexed (see IngestManifest); chunks
+        of deleted files are purged.
+        """
+        processed_count = 0
+        
+        with self.lock:
+            self.reset_progress()
+            try:
+                # Process local files (skip urls.txt)
+                processed_count += self.sync_files(workers=workers, force=force)
+                
+                # Process URLs from urls.txt file if it exists
+                urls_file = os.path.join(Config.DATA_DIR, "urls.txt")
+                if os.path.exists(urls_file):
+                    processed_count += self.process_urls_file(urls_file, force=force)
+                else:
+                    self.purge_missing(set(), kind="url")
+            finally:
+                self.save()
+        
+        return processed_count
+    
+    def reset_progress(self):
+        with self._progress_lock:
+            self._progress = {"sources_total": 0, "sources_done": 0, "sources_skipped": 0,
+                              "chunks_embedded": 0}
+            self._progress_started = time.monotonic()
+    
+    def track_progress(self, total: int = 0, done: int = 0, skipped: int = 0, chunks: int = 0):
+        """Count ingestion progress and pass it to the progress callback, if any."""
+        with self._progress_lock:
+            self._progress["sources_total"] += total
+            self._progress["sources_done"] += done
+            self._progress["sources_skipped"] += skipped
+            self._progress["chunks_embedded"] += chunks
+        if self.progress:
+            self.progress(**self.progress_snapshot())
+    
+    def progress_snapshot(self) -> Dict[str, Any]:
+        """Sources done, chunks embedded and throughput since the current run started."""
+        with self._progress_lock:
+            elapsed = time.monotonic() - self._progress_started
+            snapshot = dict(self._progress)
+        snapshot["elapsed_seconds"] = round(elapsed, 1)
+        snapshot["chunks_per_second"] = round(snapshot["chunks_embedded"] / elapsed, 1) if elapsed > 0 else 0.0
+        return snapshot
+    
+    def save(self):
+        """Write buffered chunks, then persist the manifest, vector store and lexical/quantized indexes."""
+        self.write_buffer.flush()
+        self.manifest.save()
+        saved = self.vector_store.save()
+        saved = self.lexical_index.save() or saved
+        if self.quantized_store is not None:
+            saved = self.quantized_store.save() or saved
+        if saved:
+            # Lets running apps know to reload the indexes
+            bump_index_generation()
+    
+    def rebuild_lexical_index(self, page_size: int = 5000):
+        """Build the BM25 index from chunks already in the vector store."""
+        print("Building lexical index from the existing vector store...")
+        self.lexical_index.clear()
+        offset = 0
+        while True:
+            page = self.vector_store.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.lexical_index.add(page["ids"], page["documents"])
+            offset += len(page["ids"])
+        self.save()
+        print(f"Lexical index built with {len(self.lexical_index)} chunks")
+    
+    def rebuild_quantized_store(self, page_size: int = 5000):
+        """Build the quantized vector store from embeddings already in the vector store."""
+        print(f"Building {Config.QUANTIZED_DTYPE} vector store from the existing vector store...")
+        self.quantized_store.clear()
+        offset = 0
+        while True:
+            page = self.vector_store.get(include=["embeddings"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.quantized_store.add(page["ids"], page["embeddings"])
+            offset += len(page["ids"])
+        self.save()
+        print(f"Quantized vector store built with {len(self.quantized_store)} vectors")
+    
+    def sync_files(self, workers: Optional[int] = None, force: bool = False) -> int:
+        """Index new or changed local files and purge deleted ones.
+        
+        With more than one worker, files go through the staged IngestionPipeline
+        (process pool extraction, batched embedding, single writer). With one,
+        no process pool is started at all, not even for large PDFs, so it is
+        safe to run inside the threaded web server.
+        """
         processed_count = 0
+        workers = Config.INGEST_WORKERS if workers is None else workers
         
-        # Process local files (skip urls.txt)
+        with self.lock:
+            file_paths = self.discover_files()
+            self.purge_missing(set(file_paths), kind="file")
+            
+            pending = [path for path in file_paths if force or not self.manifest.is_unchanged(path)]
+            skipped = len(file_paths) - len(pending)
+            if skipped:
+                print(f"Skipping {skipped} unchanged files")
+            self.track_progress(total=len(pending), skipped=skipped)
+            
+            if workers > 1 and len(pending) > 1:
+                processed_count += IngestionPipeline(self, extract_workers=workers).run(pending)
+            else:
+                page_workers = Config.PDF_PAGE_WORKERS if workers > 1 else 1
+                for file_path in pending:
+                    if self.process_file(file_path, page_workers=page_workers):
+                        processed_count += 1
+                    self.track_progress(done=1)
+                self.write_buffer.flush()
+        
+        return processed_count
+    
+    def discover_files(self) -> List[str]:
+        """List supported files under the data directory, excluding urls.txt."""
+        file_paths = []
         for ext in Config.SUPPORTED_EXTENSIONS:
             pattern = os.path.join(Config.DATA_DIR, f"**/*{ext}")
             for file_path in glob.glob(pattern, recursive=True):
                 # Skip urls.txt file
                 if file_path.endswith('urls.txt'):
                     continue
-                if self.process_file(file_path):
-                    processed_count += 1
-        
-        # Process URLs from urls.txt file if it exists
-        urls_file = os.path.join(Config.DATA_DIR, "urls.txt")
-        if os.path.exists(urls_file):
-            processed_count += self.process_urls_file(urls_file)
-        
-        return processed_count
+                file_paths.append(file_path)
+        return sorted(file_paths)
     
-    def process_urls_file(self, urls_file_path: str) -> int:
+    def process_urls_file(self, urls_file_path: str, force: bool = False) -> int:
         """Process URLs from urls.txt file."""
         processed_count = 0
         try:
             with open(urls_file_path, 'r', encoding='utf-8') as f:
                 urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
             
-            for url in urls:
-                if self.process_url(url):
-                    processed_count += 1
+            with self.lock:
+                self.purge_missing(set(urls), kind="url")
+                self.track_progress(total=len(urls))
+                # Pages are fetched concurrently and indexed one by one as they arrive
+                fetcher = UrlFetcher()
+                for url, text in fetcher.fetch_texts(urls):
+                    if self.process_url(url, force=force, text=text):
+                        processed_count += 1
+                    self.track_progress(done=1)
+                self.write_buffer.flush()
                     
         except Exception as e:
             print(f"Error processing URLs file {urls_file_path}: {e}")
         
         return processed_count
     
-    def process_file(self, file_path: str) -> bool:
-        """Process a single file."""
+    def process_file(self, file_path: str, page_workers: Optional[int] = None) -> bool:
+        """Process a single file.
+        
+        page_workers > 1 (default Config.PDF_PAGE_WORKERS) extracts large PDFs
+        across a process pool; pass 1 to stay in this process.
+        """
+        page_workers = Config.PDF_PAGE_WORKERS if page_workers is None else page_workers
         try:
             print(f"Processing file: {file_path}")
             
-            if file_path.lower().endswith('.pdf'):
-                text = extract_text_from_pdf(file_path)
-            else:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    text = f.read()
-            
-            text = clean_text(text)
-            if not text:
-                print(f"No text extracted from {file_path}")
-                return False
-            
-            chunks = chunk_text(text, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
-            if not chunks:
-                print(f"No chunks created from {file_path}")
-                return False
-                
-            self._add_to_vector_db(chunks, file_path)
-            return True
+            fingerprint = file_fingerprint(file_path)
+            chunks = extract_file_chunks(file_path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP,
+                                         page_workers=page_workers, chunker=get_chunker())
+            return self.index_source(file_path, "file", fingerprint, chunks)
             
         except Exception as e:
             print(f"Error processing file {file_path}: {e}")
             return False
     
-    def process_url(self, url: str) -> bool:
-        """Process a URL."""
+    def process_url(self, url: str, force: bool = False, text: Optional[str] = None) -> bool:
+        """Process a URL, skipping re-embedding if its text has not changed.
+        
+        Pass text when the page has already been fetched (see UrlFetcher).
+        """
         try:
             print(f"Processing URL: {url}")
             
-            if 'youtube.com/' in url or 'youtu.be/' in url:
-                text = extract_transcript_from_youtube(url)
-            else:
-                text = extract_text_from_website(url)
+            if text is None:
+                if 'youtube.com/' in url or 'youtu.be/' in url:
+                    text = extract_transcript_from_youtube(url)
+                else:
+                    text = extract_text_from_website(url)
             
             text = clean_text(text)
             if not text:
                 print(f"No text extracted from URL {url}")
                 return False
             
-            chunks = chunk_text(text, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
-            if not chunks:
-                print(f"No chunks created from URL {url}")
+            fingerprint = text_fingerprint(text)
+            entry = self.manifest.get(url)
+            if (not force and entry and entry.get("sha256") == fingerprint["sha256"]
+                    and self.manifest.is_current(entry)):
+                print(f"URL unchanged, skipping: {url}")
                 return False
-                
-            self._add_to_vector_db(chunks, url)
-            return True
+            
+            return self.index_source(url, "url", fingerprint, get_chunker()([(None, text)]))
             
         except Exception as e:
             print(f"Error processing URL {url}: {e}")
             return False
     
-    def _add_to_vector_db(self, chunks: List[str], source: str):
-        """Add chunks to vector database."""
-        documents = []
-        metadatas = []
-        ids = []
+    def index_source(self, source: str, kind: str, fingerprint: Dict[str, Any],
+                     chunks: Iterable[Dict[str, Any]], buffer: Optional[WriteBuffer] = None) -> bool:
+        """Bring the vector store in line with a source's current chunks and record it in the manifest.
+        
+        Chunks are consumed as they are produced and passed on in groups of
+        the write buffer's batch size, so only the source's chunk IDs are
+        kept for the whole document. Chunk IDs depend only on the source and
+        the chunk's text, not its position, so only chunks that are new since
+        the last run are embedded and only chunks that disappeared are
+        deleted; chunks that merely moved just get their metadata
+        (chunk_index, offsets) updated. The source is recorded in the
+        manifest, and its stale chunks deleted, once all of its records are
+        written. If the chunks cannot be read to the end, the new chunks
+        already queued are removed again and the source keeps its old ones.
+        """
+        if buffer is None:
+            buffer = self.write_buffer
+        previous = self.indexed_chunk_ids(source)
+        ids: List[str] = []
+        new_ids: List[str] = []
+        try:
+            for group in _batched(self.build_records(chunks, source), buffer.batch_size):
+                documents, metadatas, group_new_ids, kept_ids, kept_metadatas = self.diff_records(group, previous)
+                ids.extend(doc_id for _, _, doc_id in group)
+                new_ids.extend(group_new_ids)
+                buffer.add_records(documents, metadatas, group_new_ids, kept_ids, kept_metadatas)
+        except Exception:
+            buffer.abort(source, new_ids)
+            raise
         
-        for i, chunk in enumerate(chunks):
+        current = set(ids)
+        stale_ids = [doc_id for doc_id in self.manifest.chunk_ids(source) if doc_id not in current]
+        if not ids:
+            print(f"No chunks created from {source}")
+        if new_ids:
+            print(f"Queued {len(new_ids)} new chunks from {source}")
+        if stale_ids:
+            print(f"Removing {len(stale_ids)} stale chunks from {source}")
+        
+        buffer.complete(source, kind, fingerprint, ids, stale_ids)
+        return bool(ids)
+    
+    def indexed_chunk_ids(self, source: str) -> Optional[set]:
+        """IDs of the source's chunks that can be kept, or None if everything needs (re-)writing."""
+        entry = self.manifest.get(source)
+        if not entry or not self.manifest.is_current(entry):
+            # New source, or the model or chunk format changed
+            return None
+        return set(entry["chunk_ids"])
+    
+    def diff_records(self, records: List[Tuple[str, Dict, str]], previous: Optional[set]
+                     ) -> Tuple[List[str], List[Dict], List[str], List[str], List[Dict]]:
+        """Split (document, metadata, id) records into new ones and already indexed ones (ids, metadatas)."""
+        documents, metadatas, new_ids, kept_ids, kept_metadatas = [], [], [], [], []
+        for doc, meta, doc_id in records:
+            if previous is not None and doc_id in previous:
+                kept_ids.append(doc_id)
+                kept_metadatas.append(meta)
+            else:
+                documents.append(doc)
+                metadatas.append(meta)
+                new_ids.append(doc_id)
+        return documents, metadatas, new_ids, kept_ids, kept_metadatas
+    
+    def purge_missing(self, present: set, kind: str):
+        """Delete chunks of manifest sources of the given kind that no longer exist."""
+        purged = False
+        for source in self.manifest.sources(kind):
+            if source in present:
+                continue
+            stale_ids = self.manifest.chunk_ids(source)
+            if stale_ids:
+                self.delete_records(stale_ids)
+                purged = True
+            self.manifest.remove(source)
+            print(f"Purged {len(stale_ids)} chunks from removed source {source}")
+        if purged:
+            bump_index_generation()
+    
+    def build_records(self, chunks: Iterable[Dict[str, Any]], source: str) -> Iterator[Tuple[str, Dict, str]]:
+        """Turn a source's chunk records into the (document, metadata, id) records stored in the vector store.
+        
+        Page numbers and character offsets from the chunker are kept in the
+        metadata so citations never need the source to be re-read, along
+        with the source-level fields retrieval can filter on (see
+        source_metadata). Yields records as the chunks arrive.
+        """
+        shared = source_metadata(source)
+        occurrences: Dict[str, int] = {}
+        
+        for i, record in enumerate(chunks):
+            chunk = record["text"]
             if len(chunk.strip()) < 50:  # Skip very short chunks
                 continue
                 
-            doc_id = generate_document_id(chunk, f"{source}_{i}")
-            documents.append(chunk)
-            metadatas.append({
+            # Position-independent, so inserting text early on keeps later chunks' IDs;
+            # repeated identical chunks are told apart by occurrence
+            doc_id = generate_document_id(chunk, source)
+            occurrence = occurrences.get(doc_id, 0)
+            occurrences[doc_id] = occurrence + 1
+            if occurrence:
+                doc_id = generate_document_id(chunk, f"{source}#{occurrence}")
+            metadata = {
                 "source": source,
                 "chunk_index": i,
-                "chunk_length": len(chunk)
-            })
-            ids.append(doc_id)
+                "chunk_length": len(chunk),
+                **shared
+            }
+            for key in ("page_start", "page_end", "char_start", "char_end"):
+                if record.get(key) is not None:
+                    metadata[key] = record[key]
+            yield chunk, metadata, doc_id
+    
+    def write_records(self, documents: List[str], metadatas: List[Dict], ids: List[str],
+                      embeddings: Optional[List[List[float]]] = None):
+        """Write records to the vector store, embedding them first if needed.
         
-        if documents:
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"Added {len(documents)} chunks from {source}")
+        Upserts, so re-embedded chunks replace their previous vectors. Callers
+        bump the index generation once they have finished a source, rather
+        than once per batch, so query caches are not invalidated constantly.
+        """
+        if embeddings is None:
+            embeddings = self.embeddings.encode_documents(documents)
+        self.vector_store.upsert(ids, embeddings, documents, metadatas)
+        self.lexical_index.add(ids, documents)
+        if self.quantized_store is not None:
+            self.quantized_store.add(ids, embeddings)
+        self.track_progress(chunks=len(documents))
+    
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        """Refresh the metadata of chunks that are already indexed (no re-embedding)."""
+        self.vector_store.update_metadata(ids, metadatas)
+    
+    def delete_records(self, ids: List[str]):
+        """Remove chunks from the vector store (see write_records about the index generation)."""
+        self.vector_store.delete(ids)
+        self.lexical_index.remove(ids)
+        if self.quantized_store is not None:
+            self.quantized_store.remove(ids)
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of up to size items."""
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
 
 def main():
     """Main function to ingest data."""
+    parser = argparse.ArgumentParser(description="Index documents and URLs into the vector database.")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS,
+                        help="Extraction worker processes (1 = serial ingestion)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-index every source even if it is unchanged")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and index documents as they are added, changed or removed")
+    args = parser.parse_args()
+    
     # Create directories if they don't exist
     os.makedirs(Config.DATA_DIR, exist_ok=True)
     os.makedirs(Config.VECTOR_DB_PATH, exist_ok=True)
     
     ingestor = DataIngestor()
-    processed_count = ingestor.process_documents()
+    processed_count = ingestor.process_documents(workers=args.workers, force=args.force)
     
     print(f"Data ingestion complete. Processed {processed_count} sources.")
     print(f"Vector database created at: {Config.VECTOR_DB_PATH}")
+    
+    if args.watch:
+        from document_watcher import DocumentWatcher
+        watcher = DocumentWatcher(ingestor, workers=args.workers)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            watcher.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
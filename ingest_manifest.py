@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+from token_chunker import active_strategy
+from config import Config
+
+MANIFEST_FILE = "ingest_manifest.json"
+
+# Bump when the stored chunk text or metadata format changes, so existing
+# sources are re-indexed with the new format
+CHUNK_FORMAT_VERSION = 3
+
+def chunking_signature() -> str:
+    """Identifies how chunks were produced; sources indexed differently are rebuilt."""
+    if active_strategy() == "tokens":
+        return f"v{CHUNK_FORMAT_VERSION}:tokens:{Config.CHUNK_MAX_TOKENS}:{Config.CHUNK_OVERLAP_TOKENS}"
+    return f"v{CHUNK_FORMAT_VERSION}:{Config.CHUNK_SIZE}:{Config.CHUNK_OVERLAP}"
+
+def file_fingerprint(file_path: str) -> Dict[str, Any]:
+    """Size, mtime and SHA-256 of a file, used to detect changes between runs."""
+    stat = os.stat(file_path)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest.hexdigest()}
+
+def text_fingerprint(text: str) -> Dict[str, Any]:
+    """Fingerprint for sources without a file on disk, such as URLs."""
+    return {"sha256": hashlib.sha256(text.encode('utf-8', errors='ignore')).hexdigest()}
+
+class IngestManifest:
+    """Record of what has been indexed, stored next to the vector database.
+
+    Each source (file path or URL) maps to its fingerprint, the IDs of the
+    chunks it produced and the embedding model used, so unchanged sources can
+    be skipped and stale chunks deleted when a source changes or disappears.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.VECTOR_DB_PATH, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = 0
+        self._load()
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(source)
+            return dict(entry) if entry else None
+
+    def sources(self, kind: Optional[str] = None) -> List[str]:
+        with self._lock:
+            return [source for source, entry in self._entries.items()
+                    if kind is None or entry.get("kind") == kind]
+
+    def chunk_ids(self, source: str) -> List[str]:
+        with self._lock:
+            entry = self._entries.get(source)
+            return list(entry["chunk_ids"]) if entry else []
+
+    def is_unchanged(self, file_path: str) -> bool:
+        """True if a file matches its manifest entry.
+
+        Size and mtime are checked first; the file is only hashed when they
+        differ, and a matching hash just refreshes the stored stat.
+        """
+        entry = self.get(file_path)
+        if not entry or not self.is_current(entry):
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return True
+        fingerprint = file_fingerprint(file_path)
+        if fingerprint["sha256"] != entry.get("sha256"):
+            return False
+        with self._lock:
+            self._entries[file_path].update(fingerprint)
+            self._dirty += 1
+        return True
+
+    @staticmethod
+    def is_current(entry: Dict[str, Any]) -> bool:
+        """True if an entry was indexed with the current embedding model and chunk format."""
+        return (entry.get("embedding_model") == Config.EMBEDDING_MODEL
+                and entry.get("chunking") == chunking_signature())
+
+    def record(self, source: str, kind: str, fingerprint: Dict[str, Any], chunk_ids: List[str]):
+        with self._lock:
+            self._entries[source] = {
+                "kind": kind,
+                **fingerprint,
+                "chunk_ids": list(chunk_ids),
+                "embedding_model": Config.EMBEDDING_MODEL,
+                "chunking": chunking_signature(),
+                "indexed_at": time.time()
+            }
+            self._dirty += 1
+        self._maybe_save()
+
+    def remove(self, source: str):
+        with self._lock:
+            if self._entries.pop(source, None) is not None:
+                self._dirty += 1
+        self._maybe_save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({"version": 1, "sources": self._entries})
+            self._dirty = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def _maybe_save(self):
+        # Periodic checkpoint so an interrupted run keeps most of its progress
+        if self._dirty >= 50:
+            self.save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f).get("sources", {})
+        except (OSError, ValueError) as e:
+            print(f"Error reading ingestion manifest {self.path}, re-indexing everything: {e}")
+            self._entries = {}
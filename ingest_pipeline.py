@@ -0,0 +1,382 @@
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from utils import extract_file_chunks
+from ingest_manifest import file_fingerprint
+from cache import bump_index_generation
+from token_chunker import get_chunker
+from config import Config
+
+# Marks the end of a stage's input
+_DONE = object()
+
+def _prepare_file(file_path: str, spool_dir: str) -> Tuple[Dict[str, Any], str]:
+    """Worker-process task: fingerprint and chunk one file.
+
+    Chunks are streamed to a JSON-lines spool file as they are produced
+    (returning them would hold the whole list in both processes); returns
+    the fingerprint and the spool path.
+    """
+    fingerprint = file_fingerprint(file_path)
+    fd, spool_path = tempfile.mkstemp(suffix=".jsonl", dir=spool_dir)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for chunk in extract_file_chunks(file_path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP,
+                                             chunker=get_chunker()):
+                f.write(json.dumps(chunk) + "\n")
+    except BaseException:
+        os.remove(spool_path)
+        raise
+    return fingerprint, spool_path
+
+def _read_spool(spool_path: str) -> Iterator[Dict[str, Any]]:
+    with open(spool_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+class _Batch:
+    """Records waiting to be embedded and written, plus the sources they complete."""
+
+    def __init__(self):
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.ids: List[str] = []
+        # Already indexed chunks whose metadata (position, offsets) is refreshed
+        self.update_ids: List[str] = []
+        self.update_metadatas: List[Dict] = []
+        # (end offset in this batch, source, kind, fingerprint, all chunk ids, stale chunk ids);
+        # all chunk ids is None for an aborted source, whose stale ids are its partially written chunks
+        self.completed: List[Tuple[int, str, str, Optional[Dict[str, Any]], Optional[List[str]], List[str]]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.documents or self.update_ids or self.completed)
+
+    def add_records(self, documents: List[str], metadatas: List[Dict], ids: List[str],
+                    kept_ids: Optional[List[str]] = None, kept_metadatas: Optional[List[Dict]] = None):
+        """Queue new records, and metadata updates for records that are already indexed."""
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self.ids.extend(ids)
+        self.update_ids.extend(kept_ids or [])
+        self.update_metadatas.extend(kept_metadatas or [])
+
+    def complete(self, source: str, kind: str, fingerprint: Optional[Dict[str, Any]],
+                 ids: Optional[List[str]], stale_ids: List[str]):
+        """Mark a source as complete after the records queued so far; its stale ids are deleted then."""
+        self.completed.append((len(self.documents), source, kind, fingerprint, ids, stale_ids))
+
+    def split(self, size: int) -> "_Batch":
+        """Remove and return the first `size` records, with the sources they complete."""
+        head = _Batch()
+        head.documents, self.documents = self.documents[:size], self.documents[size:]
+        head.metadatas, self.metadatas = self.metadatas[:size], self.metadatas[size:]
+        head.ids, self.ids = self.ids[:size], self.ids[size:]
+        head.update_ids, self.update_ids = self.update_ids, []
+        head.update_metadatas, self.update_metadatas = self.update_metadatas, []
+        head.completed = [entry for entry in self.completed if entry[0] <= size]
+        self.completed = [(entry[0] - size,) + entry[1:] for entry in self.completed if entry[0] > size]
+        return head
+
+def _finish_sources(ingestor, batch: _Batch, failed_sources: set):
+    """After a batch is written: delete the stale chunks of the sources it completes and record them.
+
+    A source with a failed batch keeps its old chunks and stays out of the
+    manifest, so queries still find it and the next run retries it. An
+    aborted source (its chunks could not be read to the end) has the new
+    chunks written so far removed again. The index generation is bumped
+    once per batch that finishes sources, so query-side caches are
+    invalidated per source rather than per write.
+    """
+    for _, source, kind, fingerprint, ids, stale_ids in batch.completed:
+        aborted = ids is None
+        if source in failed_sources:
+            failed_sources.discard(source)
+            if not aborted:
+                continue
+        try:
+            if stale_ids:
+                ingestor.delete_records(stale_ids)
+        except Exception as e:
+            print(f"Error removing stale chunks of {source}: {e}")
+            continue
+        if not aborted:
+            ingestor.manifest.record(source, kind, fingerprint, ids)
+    if batch.completed:
+        bump_index_generation()
+
+class IngestionPipeline:
+    """Staged, parallel ingestion of local files.
+
+    1. A process pool fingerprints, extracts, cleans and chunks files.
+    2. Embedding threads drop chunks that are already indexed and turn the
+       rest into fixed-size batches of embeddings.
+    3. A single writer thread bulk-writes batches into the vector store, deletes
+       stale chunks and records finished sources in the manifest.
+
+    A partial batch is embedded anyway once its oldest record has waited
+    Config.INGEST_FLUSH_SECONDS, so slow extraction does not hold back
+    chunks that are ready.
+
+    Stages are connected by bounded queues, so a slow stage throttles the ones
+    before it. Worker processes spool each file's chunks to a temporary file
+    as they are produced, and the embedders stream them from there into their
+    batches, so a large document is never held in memory as a whole.
+    """
+
+    def __init__(self, ingestor, extract_workers: Optional[int] = None,
+                 embed_workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        self.ingestor = ingestor
+        self.extract_workers = max(1, extract_workers or Config.INGEST_WORKERS)
+        self.embed_workers = max(1, embed_workers or Config.INGEST_EMBED_WORKERS)
+        self.batch_size = max(1, batch_size or Config.INGEST_BATCH_SIZE)
+        self.queue_size = max(1, queue_size or Config.INGEST_QUEUE_SIZE)
+        self.max_delay = Config.INGEST_FLUSH_SECONDS
+
+    def run(self, file_paths: List[str]) -> int:
+        """Ingest the given files and return the number of sources that produced chunks."""
+        if not file_paths:
+            return 0
+
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        write_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        stats = {"sources": 0, "chunks": 0}
+        stats_lock = threading.Lock()
+        started_at = time.monotonic()
+        spool_dir = tempfile.mkdtemp(prefix="rag-ingest-")
+
+        embedders = [
+            threading.Thread(target=self._embed_stage, args=(chunk_queue, write_queue, stats, stats_lock),
+                             name=f"ingest-embed-{i}", daemon=True)
+            for i in range(self.embed_workers)
+        ]
+        writer = threading.Thread(target=self._write_stage, args=(write_queue, stats, stats_lock),
+                                  name="ingest-writer", daemon=True)
+        for thread in embedders:
+            thread.start()
+        writer.start()
+
+        try:
+            self._extract_stage(file_paths, chunk_queue, spool_dir)
+        finally:
+            for _ in embedders:
+                chunk_queue.put(_DONE)
+            for thread in embedders:
+                thread.join()
+            write_queue.put(_DONE)
+            writer.join()
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+        elapsed = time.monotonic() - started_at
+        rate = stats["chunks"] / elapsed if elapsed > 0 else 0.0
+        print(f"Parallel ingestion: {stats['sources']} sources, {stats['chunks']} chunks "
+              f"in {elapsed:.1f}s ({rate:.1f} chunks/sec)")
+        return stats["sources"]
+
+    def _extract_stage(self, file_paths: List[str], chunk_queue: "queue.Queue", spool_dir: str):
+        """Chunk files in worker processes, keeping a bounded number in flight."""
+        pending_paths = list(reversed(file_paths))
+        max_in_flight = self.extract_workers + self.queue_size
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers) as executor:
+            in_flight = {}
+            while pending_paths or in_flight:
+                while pending_paths and len(in_flight) < max_in_flight:
+                    file_path = pending_paths.pop()
+                    print(f"Processing file: {file_path}")
+                    future = executor.submit(_prepare_file, file_path, spool_dir)
+                    in_flight[future] = file_path
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    try:
+                        fingerprint, spool_path = future.result()
+                    except Exception as e:
+                        print(f"Error processing file {file_path}: {e}")
+                        self.ingestor.track_progress(done=1)
+                        continue
+                    # Blocks when the embedding stage falls behind
+                    chunk_queue.put((file_path, fingerprint, spool_path))
+
+    def _embed_stage(self, chunk_queue: "queue.Queue", write_queue: "queue.Queue",
+                     stats: Dict, stats_lock: threading.Lock):
+        """Stream spooled chunks across sources into fixed-size batches and embed them."""
+        buffer = _EmbeddingBuffer(self.ingestor, write_queue, self.batch_size, self.max_delay)
+        while True:
+            item = chunk_queue.get()
+            if item is _DONE:
+                break
+            source, fingerprint, spool_path = item
+            try:
+                if self.ingestor.index_source(source, "file", fingerprint, _read_spool(spool_path), buffer):
+                    with stats_lock:
+                        stats["sources"] += 1
+            except Exception as e:
+                print(f"Error processing file {source}: {e}")
+            finally:
+                os.remove(spool_path)
+        buffer.flush()
+
+    def _write_stage(self, write_queue: "queue.Queue", stats: Dict, stats_lock: threading.Lock):
+        """Single writer: the only thread that touches the vector store and manifest."""
+        failed_sources = set()
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            batch, embeddings = item
+            try:
+                if isinstance(embeddings, Exception):
+                    raise embeddings
+                if batch.documents:
+                    self.ingestor.write_records(batch.documents, batch.metadatas, batch.ids, embeddings)
+                if batch.update_ids:
+                    self.ingestor.update_metadata(batch.update_ids, batch.update_metadatas)
+            except Exception as e:
+                print(f"Error writing batch of {len(batch.documents)} chunks: {e}")
+                # Leave these sources out of the manifest so the next run retries them
+                failed_sources.update(meta["source"] for meta in batch.metadatas)
+                failed_sources.update(entry[1] for entry in batch.completed)
+            else:
+                with stats_lock:
+                    stats["chunks"] += len(batch.documents)
+                if batch.documents:
+                    print(f"Added {len(batch.documents)} chunks")
+            _finish_sources(self.ingestor, batch, failed_sources)
+            self.ingestor.track_progress(done=len(batch.completed))
+
+class WriteBuffer:
+    """Collects new chunks across sources and writes them in fixed-size batches.
+
+    Used by the serial ingestion path (single files, URLs, the watcher), which
+    otherwise embeds each source in one call: one giant call for a huge PDF,
+    many tiny ones for small files. Records are embedded Config.INGEST_BATCH_SIZE
+    at a time and upserted with their precomputed embeddings. The buffer is
+    flushed when a batch fills up or, from a timer, when its oldest record has
+    waited Config.INGEST_FLUSH_SECONDS, and a source is recorded in the
+    manifest only once all of its chunks are written.
+    """
+
+    def __init__(self, ingestor, batch_size: Optional[int] = None, max_delay: Optional[float] = None):
+        self.ingestor = ingestor
+        self.batch_size = max(1, batch_size or Config.INGEST_BATCH_SIZE)
+        self.max_delay = Config.INGEST_FLUSH_SECONDS if max_delay is None else max_delay
+        self._batch = _Batch()
+        self._oldest: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._failed_sources = set()
+        self._lock = threading.RLock()
+        self.chunks_written = 0
+        self.write_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._batch.documents)
+
+    def add_records(self, documents: List[str], metadatas: List[Dict], ids: List[str],
+                    kept_ids: Optional[List[str]] = None, kept_metadatas: Optional[List[Dict]] = None):
+        """Queue records of a source, writing full batches (or everything, once the delay is up)."""
+        with self._lock:
+            self._batch.add_records(documents, metadatas, ids, kept_ids, kept_metadatas)
+            self._queued()
+
+    def complete(self, source: str, kind: str, fingerprint: Optional[Dict[str, Any]],
+                 ids: List[str], stale_ids: List[str]):
+        """Mark a source as fully queued: once its records are written, its stale chunks are
+        deleted and it is recorded in the manifest with all of its chunk ids."""
+        with self._lock:
+            self._batch.complete(source, kind, fingerprint, ids, stale_ids)
+            self._queued()
+
+    def abort(self, source: str, new_ids: List[str]):
+        """Give up on a source part way through: the new chunks queued for it are removed
+        again once written, and it stays out of the manifest."""
+        with self._lock:
+            self._batch.complete(source, "", None, None, new_ids)
+            self._queued()
+
+    def _queued(self):
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        while len(self._batch.documents) >= self.batch_size:
+            self._write(self._batch.split(self.batch_size))
+        if time.monotonic() - self._oldest >= self.max_delay:
+            self.flush()
+        elif not self._batch:
+            self._oldest = None
+            self._cancel_timer()
+        elif self._timer is None:
+            # Writes the partial batch even if nothing else arrives
+            self._timer = threading.Timer(self._oldest + self.max_delay - time.monotonic(), self._flush_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write everything still buffered."""
+        with self._lock:
+            self._cancel_timer()
+            if self._batch:
+                self._write(self._batch)
+                self._batch = _Batch()
+            self._oldest = None
+
+    def _flush_due(self):
+        with self._lock:
+            self._timer = None
+            if self._oldest is not None:
+                self.flush()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def chunks_per_second(self) -> float:
+        """Embedding and write throughput of the batches written so far."""
+        return self.chunks_written / self.write_seconds if self.write_seconds > 0 else 0.0
+
+    def _write(self, batch: _Batch):
+        started = time.monotonic()
+        try:
+            if batch.documents:
+                embeddings = self.ingestor.embeddings.encode_documents(batch.documents)
+                self.ingestor.write_records(batch.documents, batch.metadatas, batch.ids, embeddings)
+            if batch.update_ids:
+                self.ingestor.update_metadata(batch.update_ids, batch.update_metadatas)
+        except Exception as e:
+            print(f"Error writing batch of {len(batch.documents)} chunks: {e}")
+            # Leave these sources out of the manifest so the next run retries them
+            self._failed_sources.update(meta["source"] for meta in batch.metadatas)
+            self._failed_sources.update(entry[1] for entry in batch.completed)
+        else:
+            elapsed = time.monotonic() - started
+            self.chunks_written += len(batch.documents)
+            self.write_seconds += elapsed
+            if batch.documents:
+                rate = len(batch.documents) / elapsed if elapsed > 0 else 0.0
+                print(f"Added {len(batch.documents)} chunks ({rate:.1f} chunks/sec)")
+        _finish_sources(self.ingestor, batch, self._failed_sources)
+
+class _EmbeddingBuffer(WriteBuffer):
+    """WriteBuffer of a pipeline embed thread: batches are embedded here and handed to the writer thread."""
+
+    def __init__(self, ingestor, write_queue: "queue.Queue", batch_size: int, max_delay: float):
+        super().__init__(ingestor, batch_size, max_delay)
+        self.write_queue = write_queue
+
+    def _write(self, batch: _Batch):
+        embeddings = None
+        if batch.documents:
+            try:
+                embeddings = self.ingestor.embeddings.encode_documents(batch.documents)
+            except Exception as e:
+                print(f"Error embedding batch of {len(batch.documents)} chunks: {e}")
+                embeddings = e
+        # Blocks when the writer falls behind
+        self.write_queue.put((batch, embeddings))
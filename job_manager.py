@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+from llm_pool import QueueFullError
+from config import Config
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+# handler(params, report_progress) -> JSON-serializable result
+JobHandler = Callable[[Dict[str, Any], Callable[..., None]], Any]
+
+class JobManager:
+    """Runs long queries and ingestion in the background, tracked in SQLite.
+
+    Jobs are submitted by kind ("query", "ingest", ... see register()) and
+    run on a bounded thread pool; submissions beyond the pool plus
+    Config.JOB_QUEUE_SIZE are rejected with QueueFullError. Status, progress
+    and results are written to Config.JOB_DB_PATH, so finished jobs can be
+    fetched after a restart; jobs still queued at shutdown are resumed and
+    jobs that were running are marked failed.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, workers: Optional[int] = None,
+                 max_queue_size: Optional[int] = None):
+        self.db_path = db_path or Config.JOB_DB_PATH
+        self.workers = max(1, workers or Config.JOB_WORKERS)
+        self.max_queue_size = Config.JOB_QUEUE_SIZE if max_queue_size is None else max_queue_size
+        self.retention = Config.JOB_RETENTION_SECONDS
+        self._handlers: Dict[str, JobHandler] = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._versions: Dict[str, int] = {}
+        self._latest_progress: Dict[str, Dict[str, Any]] = {}  # newer than what is in SQLite
+        self._pending = 0
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+            "params TEXT NOT NULL, progress TEXT, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at)")
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by a restart', finished_at = ? "
+            "WHERE status = 'running'", (time.time(),)
+        )
+        self._conn.commit()
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the function that runs jobs of a kind."""
+        self._handlers[kind] = handler
+
+    def resume(self):
+        """Re-schedule jobs that were still queued when the process stopped.
+
+        Call after all handlers are registered.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, kind, params FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        for job_id, kind, params in rows:
+            if kind in self._handlers:
+                with self._lock:
+                    self._pending += 1
+                self._executor.submit(self._run, job_id, kind, json.loads(params))
+            else:
+                self._finish(job_id, "failed", error=f"Unknown job type: {kind}")
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Queue a job and return its record; raises QueueFullError when saturated."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        params = params or {}
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue_size:
+                raise QueueFullError("Too many jobs in progress, try again shortly")
+            self._pending += 1
+            self._prune()
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, params, progress, created_at) "
+                "VALUES (?, ?, 'queued', ?, '{}', ?)",
+                (job_id, kind, json.dumps(params), time.time())
+            )
+            self._conn.commit()
+        self._executor.submit(self._run, job_id, kind, params)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, status, params, progress, result, error, "
+                "created_at, started_at, finished_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            progress = self._latest_progress.get(job_id)
+        if not row:
+            return None
+        job = self._to_dict(row)
+        if progress is not None:
+            job["progress"] = progress
+        return job
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first, without their results."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, kind, status, params, progress, NULL, error, "
+                "created_at, started_at, finished_at FROM jobs ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def version(self, job_id: str) -> int:
+        """Counter that increases whenever a job's state or progress changes."""
+        with self._lock:
+            return self._versions.get(job_id, 0)
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float) -> int:
+        """Block until a job's state changes past `version` (or timeout); returns the new version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(job_id, 0) != version, timeout)
+            return self._versions.get(job_id, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            return {"workers": self.workers, "in_progress": self._pending, "jobs": counts}
+
+    def _run(self, job_id: str, kind: str, params: Dict[str, Any]):
+        self._update(job_id, "status = 'running', started_at = ?", (time.time(),))
+        last_write = [0.0]
+
+        def report_progress(**progress):
+            # Subscribers see every update; SQLite is written at most twice a second
+            with self._changed:
+                self._latest_progress[job_id] = progress
+                self._bump(job_id)
+            now = time.monotonic()
+            if now - last_write[0] >= 0.5:
+                last_write[0] = now
+                self._update(job_id, "progress = ?", (json.dumps(progress),))
+
+        try:
+            result = self._handlers[kind](params, report_progress)
+            self._finish(job_id, "succeeded", result=result)
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            progress = self._latest_progress.pop(job_id, None)
+        assignments = "status = ?, result = ?, error = ?, finished_at = ?"
+        values = (status, json.dumps(result) if result is not None else None, error, time.time())
+        if progress is not None:
+            assignments += ", progress = ?"
+            values += (json.dumps(progress),)
+        self._update(job_id, assignments, values)
+
+    def _update(self, job_id: str, assignments: str, values: tuple):
+        with self._changed:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", values + (job_id,))
+            self._conn.commit()
+            self._bump(job_id)
+
+    def _bump(self, job_id: str):
+        # Caller holds the lock
+        self._versions[job_id] = self._versions.get(job_id, 0) + 1
+        self._changed.notify_all()
+
+    def _prune(self):
+        # Caller holds the lock
+        cutoff = time.time() - self.retention
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT job_id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+        )]
+        if expired:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+            )
+            for job_id in expired:
+                self._versions.pop(job_id, None)
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        job_id, kind, status, params, progress, result, error, created_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "type": kind,
+            "status": status,
+            "params": json.loads(params),
+            "progress": json.loads(progress) if progress else {},
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
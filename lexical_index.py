@@ -0,0 +1,302 @@
+import math
+import os
+import re
+import threading
+from typing import Collection, List, Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+from config import Config
+
+LEXICAL_INDEX_FILE = "bm25_index.npz"
+
+# Identifiers such as VID_0781, HKLM\SYSTEM, usbstor.sys or 10.0.0.1 stay whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[_\-.\\/:&][a-z0-9]+)*")
+_TOKEN_SEGMENTS = re.compile(r"[\\/:&]")
+_TOKEN_PARTS = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how in is it its of on or that the "
+    "this to was were what when where which who why will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms for BM25: compound identifiers, their path segments and alphanumeric parts.
+
+    "USBSTOR\\VID_0781&PID_5567" yields the whole string, "usbstor",
+    "vid_0781", "pid_5567", "vid", "0781", "pid" and "5567".
+    """
+    terms = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        parts = _TOKEN_PARTS.findall(token)
+        if len(parts) > 1:
+            segments = _TOKEN_SEGMENTS.split(token)
+            if len(segments) > 1:
+                terms.extend(segment for segment in segments
+                             if segment not in _STOPWORDS and _TOKEN_PARTS.fullmatch(segment) is None)
+            terms.extend(part for part in parts if part not in _STOPWORDS)
+    return terms
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, persisted next to the Chroma store.
+
+    Postings live in flat numpy arrays (CSR layout: per-term offsets into one
+    doc-number array and one term-frequency array), so a lookup is a couple
+    of array slices and a vectorized score per query term. Chunks added since
+    the last compaction sit in a small in-memory delta, and removed chunks
+    are tombstoned; compact() folds both into fresh arrays and runs before
+    every save.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.VECTOR_DB_PATH, LEXICAL_INDEX_FILE)
+        self.k1 = Config.BM25_K1
+        self.b = Config.BM25_B
+        self._lock = threading.RLock()
+        self._file_marker = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.int32)
+        self._doc_ids: List[str] = []
+        self._doc_numbers: Dict[str, int] = {}
+        self._doc_lens = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._delta: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._delta_size = 0
+        self._live_count = 0
+        self._total_len = 0
+        self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def add(self, ids: List[str], documents: List[str]):
+        """Index chunks; re-adding an existing id replaces it."""
+        with self._lock:
+            self.remove([doc_id for doc_id in ids if doc_id in self._doc_numbers])
+            start = len(self._doc_ids)
+            lengths = np.zeros(len(ids), dtype=np.int32)
+            for i, (doc_id, text) in enumerate(zip(ids, documents)):
+                number = start + i
+                counts: Dict[str, int] = {}
+                for term in tokenize(text or ""):
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    term_id = self._terms.setdefault(term, len(self._terms))
+                    docs, tfs = self._delta.setdefault(term_id, ([], []))
+                    docs.append(number)
+                    tfs.append(tf)
+                self._delta_size += len(counts)
+                lengths[i] = sum(counts.values())
+                self._doc_ids.append(doc_id)
+                self._doc_numbers[doc_id] = number
+            self._doc_lens = np.concatenate([self._doc_lens, lengths])
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._live_count += len(ids)
+            self._total_len += int(lengths.sum())
+            self._dirty = True
+            if self._delta_size > Config.BM25_DELTA_LIMIT:
+                self.compact()
+
+    def remove(self, ids: List[str]):
+        """Tombstone chunks; their postings are dropped at the next compaction."""
+        with self._lock:
+            for doc_id in ids:
+                number = self._doc_numbers.pop(doc_id, None)
+                if number is None or not self._alive[number]:
+                    continue
+                self._alive[number] = False
+                self._live_count -= 1
+                self._total_len -= int(self._doc_lens[number])
+                self._dirty = True
+
+    def search(self, query: str, n_results: int,
+               allowed: Optional[Collection[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to n_results (chunk id, BM25 score) pairs, best first.
+
+        With allowed, only those chunk ids are considered (metadata filters).
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._live_count:
+                return []
+            avg_len = self._total_len / self._live_count
+            doc_parts, score_parts = [], []
+            for term in terms:
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                docs, tfs = self._postings_for(term_id)
+                if not len(docs):
+                    continue
+                # df counts tombstoned postings until the next compaction
+                idf = math.log(1 + (self._live_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lens[docs] / avg_len)
+                doc_parts.append(docs)
+                score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+            if not doc_parts:
+                return []
+            docs = np.concatenate(doc_parts)
+            scores = np.concatenate(score_parts)
+            docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+            alive = self._alive[docs]
+            if allowed is not None:
+                alive &= np.fromiter((self._doc_ids[doc] in allowed for doc in docs), dtype=bool, count=len(docs))
+            docs, scores = docs[alive], scores[alive]
+            if len(docs) > n_results:
+                top = np.argpartition(-scores, n_results - 1)[:n_results]
+                docs, scores = docs[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [(self._doc_ids[docs[i]], float(scores[i])) for i in order]
+
+    def _postings_for(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        docs = tfs = None
+        if term_id + 1 < len(self._offsets):
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            docs, tfs = self._postings[start:end], self._tfs[start:end]
+        delta = self._delta.get(term_id)
+        if delta:
+            delta_docs = np.asarray(delta[0], dtype=np.int32)
+            delta_tfs = np.asarray(delta[1], dtype=np.int32)
+            if docs is None:
+                return delta_docs, delta_tfs
+            return np.concatenate([docs, delta_docs]), np.concatenate([tfs, delta_tfs])
+        if docs is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return docs, tfs
+
+    def compact(self):
+        """Merge the delta into the postings arrays and drop removed chunks."""
+        with self._lock:
+            if not self._delta and self._live_count == len(self._doc_ids):
+                return
+            # Renumber live documents densely
+            remap = np.full(len(self._doc_ids), -1, dtype=np.int64)
+            live = np.flatnonzero(self._alive)
+            remap[live] = np.arange(len(live))
+
+            n_terms = len(self._terms)
+            base_counts = np.diff(self._offsets)
+            term_of = np.repeat(np.arange(len(base_counts)), base_counts)
+            docs_parts, tfs_parts, terms_parts = [self._postings], [self._tfs], [term_of]
+            for term_id, (docs, tfs) in self._delta.items():
+                docs_parts.append(np.asarray(docs, dtype=np.int32))
+                tfs_parts.append(np.asarray(tfs, dtype=np.int32))
+                terms_parts.append(np.full(len(docs), term_id, dtype=np.int64))
+            docs = np.concatenate(docs_parts).astype(np.int64)
+            tfs = np.concatenate(tfs_parts)
+            terms = np.concatenate(terms_parts)
+
+            keep = remap[docs] >= 0
+            docs, tfs, terms = remap[docs[keep]], tfs[keep], terms[keep]
+            order = np.lexsort((docs, terms))
+            docs, tfs, terms = docs[order], tfs[order], terms[order]
+
+            # Drop terms that no longer have postings
+            term_counts = np.bincount(terms, minlength=n_terms)
+            used = np.flatnonzero(term_counts)
+            term_remap = np.full(n_terms, -1, dtype=np.int64)
+            term_remap[used] = np.arange(len(used))
+            names = [None] * n_terms
+            for term, term_id in self._terms.items():
+                names[term_id] = term
+            self._terms = {names[term_id]: i for i, term_id in enumerate(used)}
+
+            self._offsets = np.concatenate([[0], np.cumsum(term_counts[used])]).astype(np.int64)
+            self._postings = docs.astype(np.int32)
+            self._tfs = tfs.astype(np.int32)
+            self._doc_ids = [self._doc_ids[i] for i in live]
+            self._doc_numbers = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+            self._doc_lens = self._doc_lens[live]
+            self._alive = np.ones(len(live), dtype=bool)
+            self._delta = {}
+            self._delta_size = 0
+
+    def save(self) -> bool:
+        """Compact and atomically write the index; returns False if there was nothing to write."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            self.compact()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                terms=np.array(list(self._terms), dtype=str),
+                offsets=self._offsets,
+                postings=self._postings,
+                tfs=self._tfs,
+                doc_ids=np.array(self._doc_ids, dtype=str),
+                doc_lens=self._doc_lens
+            )
+            os.replace(tmp_path, self.path)
+            self._file_marker = self._stat()
+            self._dirty = False
+            return True
+
+    def reload_if_changed(self) -> bool:
+        """Pick up a newer index written by another process (e.g. ingestion)."""
+        marker = self._stat()
+        if marker == self._file_marker:
+            return False
+        with self._lock:
+            self._reset()
+            self._load()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chunks": self._live_count,
+                "terms": len(self._terms),
+                "postings": int(len(self._postings)) + self._delta_size
+            }
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        self._file_marker = self._stat()
+        if self._file_marker is None:
+            return
+        try:
+            with np.load(self.path) as data:
+                terms = data["terms"].tolist()
+                self._offsets = data["offsets"].astype(np.int64)
+                self._postings = data["postings"].astype(np.int32)
+                self._tfs = data["tfs"].astype(np.int32)
+                self._doc_ids = data["doc_ids"].tolist()
+                self._doc_lens = data["doc_lens"].astype(np.int32)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading lexical index {self.path}: {e}")
+            self._reset()
+            return
+        self._terms = {term: i for i, term in enumerate(terms)}
+        self._doc_numbers = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        self._alive = np.ones(len(self._doc_ids), dtype=bool)
+        self._live_count = len(self._doc_ids)
+        self._total_len = int(self._doc_lens.sum())
+
+def reciprocal_rank_fusion(rankings: Iterable[Tuple[List[str], float]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists given as (ids, weight) pairs: score = sum(weight / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ids, weight in rankings:
+        for rank, doc_id in enumerate(ids, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,37 +1,97 @@
 from llama_cpp import Llama
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 import re
+import threading
+from cache import LRUCache
 from config import Config
 
+ERROR_RESPONSE = "I apologize, but I encountered an error while generating a response."
+
 class LocalLLM:
-    def __init__(self):
+    def __init__(self, n_threads: Optional[int] = None):
         self.model = Llama(
             model_path=Config.LLM_MODEL_PATH,
             n_ctx=Config.MAX_CONTEXT_LENGTH,
-            n_threads=4,
+            n_threads=n_threads or Config.LLM_THREADS_PER_WORKER,
             n_gpu_layers=0,  # Set to >0 if you have GPU
             verbose=False
         )
+        self._prefix_text = ""
+        self._prefix_tokens: List[int] = []
+        self._prefix_state = None
+        self.n_ctx = Config.MAX_CONTEXT_LENGTH
+        # Prompt pieces (system text, retrieved chunks, history) repeat across queries
+        self._token_cache = LRUCache(Config.TOKEN_CACHE_SIZE)
+    
+    def cache_prefix(self, prefix: str):
+        """Evaluate a static prompt prefix once and snapshot the llama.cpp state.
+        
+        Prompts that start with this prefix only need their suffix prefilled:
+        llama.cpp reuses any KV cache entries that match the start of a new
+        prompt, and the snapshot is restored whenever another prompt has
+        overwritten them.
+        """
+        try:
+            tokens = self.model.tokenize(prefix.encode("utf-8"), special=True)
+            self.model.reset()
+            self.model.eval(tokens)
+            self._prefix_text = prefix
+            self._prefix_tokens = list(tokens)
+            self._prefix_state = self.model.save_state()
+        except Exception as e:
+            print(f"Error caching prompt prefix: {e}")
+            self._prefix_state = None
+    
+    def _restore_prefix(self, prompt: str):
+        """Load the cached prefix state unless the KV cache already holds it."""
+        if self._prefix_state is None or not prompt.startswith(self._prefix_text):
+            return
+        n_prefix = len(self._prefix_tokens)
+        if (self.model.n_tokens >= n_prefix
+                and list(self.model.input_ids[:n_prefix]) == self._prefix_tokens):
+            return
+        self.model.load_state(self._prefix_state)
     
     def generate_response(self, prompt: str, max_tokens: int = 512) -> str:
         """Generate response using local LLM."""
         try:
-            output = self.model(
-                prompt,
-                max_tokens=max_tokens,
-                temperature=0.1,
-                top_p=0.9,
-                echo=False,
-                stop=["###", "Human:", "Assistant:"]
-            )
+            self._restore_prefix(prompt)
+            output = self.model(prompt, **self._generation_kwargs(max_tokens))
             
             response = output['choices'][0]['text'].strip()
-            return self._clean_response(response)
+            return self.clean_response(response)
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "I apologize, but I encountered an error while generating a response."
+            return ERROR_RESPONSE
     
-    def _clean_response(self, response: str) -> str:
+    def generate_stream(self, prompt: str, max_tokens: int = 512) -> Iterator[str]:
+        """Generate response using local LLM, yielding text pieces as they are produced."""
+        started = False
+        try:
+            self._restore_prefix(prompt)
+            for output in self.model(prompt, stream=True, **self._generation_kwargs(max_tokens)):
+                text = output['choices'][0]['text']
+                if not started:
+                    # Match generate_response, which strips leading whitespace
+                    text = text.lstrip()
+                    started = bool(text)
+                if text:
+                    yield text
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield ERROR_RESPONSE
+    
+    def _generation_kwargs(self, max_tokens: int) -> Dict[str, Any]:
+        """Sampling settings shared by blocking and streaming generation."""
+        return {
+            "max_tokens": max_tokens,
+            "temperature": 0.1,
+            "top_p": 0.9,
+            "echo": False,
+            "stop": ["###", "Human:", "Assistant:"]
+        }
+    
+    def clean_response(self, response: str) -> str:
         """Clean and format the response."""
         # Remove any incomplete sentences at the end
         response = re.sub(r'[^.!?]+$', '', response)
@@ -40,32 +100,59 @@ class LocalLLM:
             response = response[0].upper() + response[1:]
         return response.strip()
     
+    def tokenize(self, text: str) -> List[int]:
+        """Tokenize text with the model's own tokenizer (no BOS), caching the result."""
+        tokens = self._token_cache.get(text)
+        if tokens is None:
+            tokens = self.model.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+            self._token_cache.set(text, tokens)
+        return tokens
+    
     def count_tokens(self, text: str) -> int:
-        """Count tokens in text (approximate)."""
-        return len(text.split())  # Simple approximation
+        """Count tokens in text as the model sees them."""
+        if not text:
+            return 0
+        return len(self.tokenize(text))
     
     def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
         """Truncate text to maximum number of tokens."""
-        words = text.split()
-        if len(words) <= max_tokens:
+        tokens = self.tokenize(text)
+        if len(tokens) <= max_tokens:
             return text
-        return ' '.join(words[:max_tokens])
+        if max_tokens <= 0:
+            return ""
+        return self.model.detokenize(tokens[:max_tokens]).decode("utf-8", errors="ignore")
 
 class ConversationManager:
-    def __init__(self, llm: LocalLLM):
+    def __init__(self, llm: LocalLLM, max_history_tokens: Optional[int] = None,
+                 history: Optional[List[Dict[str, str]]] = None):
         self.llm = llm
-        self.conversation_history: List[Dict[str, str]] = []
-        self.max_history_tokens = 1000
+        self.conversation_history: List[Dict[str, str]] = list(history or [])
+        self.max_history_tokens = max_history_tokens or Config.MAX_HISTORY_TOKENS
+        self._lock = threading.Lock()
     
     def add_message(self, role: str, content: str):
         """Add message to conversation history."""
-        self.conversation_history.append({"role": role, "content": content})
-        self._manage_history_size()
+        with self._lock:
+            self.conversation_history.append({"role": role, "content": content})
+            self._manage_history_size()
+    
+    def get_messages(self) -> List[Dict[str, str]]:
+        """Return a snapshot of the conversation history."""
+        with self._lock:
+            return list(self.conversation_history)
+    
+    def memory_size(self) -> int:
+        """Approximate memory held by this history, in characters."""
+        with self._lock:
+            return sum(len(msg["content"]) for msg in self.conversation_history)
     
     def get_conversation_context(self) -> str:
         """Get formatted conversation context."""
+        with self._lock:
+            messages = list(self.conversation_history)
         context = ""
-        for msg in self.conversation_history:
+        for msg in messages:
             context += f"{msg['role'].capitalize()}: {msg['content']}\n\n"
         return context.strip()
     
@@ -89,4 +176,5 @@ class ConversationManager:
     
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history = []
\ No newline at end of file
+        with self._lock:
+            self.conversation_history = []
\ No newline at end of file
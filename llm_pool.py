@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+from llm_model import LocalLLM
+from config import Config
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept another request."""
+
+class LLMWorkerPool:
+    """Bounded inference scheduler in front of a fixed set of LocalLLM workers.
+
+    Each worker owns its own llama.cpp model handle and serves one request at a
+    time, so generations never share a non-thread-safe Llama instance. Requests
+    beyond the idle workers wait in a bounded queue; once that is full new
+    requests are rejected with QueueFullError instead of piling up.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, n_threads: Optional[int] = None,
+                 max_queue_size: Optional[int] = None):
+        self.num_workers = max(1, num_workers or Config.LLM_WORKERS)
+        self.max_queue_size = Config.LLM_QUEUE_SIZE if max_queue_size is None else max_queue_size
+
+        self.workers = [LocalLLM(n_threads=n_threads) for _ in range(self.num_workers)]
+        self._idle: "queue.Queue[LocalLLM]" = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+        self._lock = threading.Lock()
+        self._pending = 0  # waiting + running
+        self._active = 0
+        self._started = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None) -> Iterator[LocalLLM]:
+        """Reserve an idle worker for the duration of the block."""
+        with self._lock:
+            if self._pending >= self.num_workers + self.max_queue_size:
+                self._rejected += 1
+                raise QueueFullError("LLM queue is full, please retry shortly")
+            self._pending += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._pending - self.num_workers)
+
+        enqueued_at = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=timeout or Config.LLM_QUEUE_TIMEOUT)
+        except queue.Empty:
+            with self._lock:
+                self._pending -= 1
+                self._rejected += 1
+            raise QueueFullError("Timed out waiting for an LLM worker")
+
+        started_at = time.monotonic()
+        with self._lock:
+            self._active += 1
+            self._started += 1
+            self._total_wait += started_at - enqueued_at
+
+        try:
+            yield worker
+        finally:
+            self._idle.put(worker)
+            with self._lock:
+                self._active -= 1
+                self._pending -= 1
+                self._completed += 1
+                self._total_run += time.monotonic() - started_at
+
+    def cache_prefix(self, prefix: str):
+        """Prefill a shared prompt prefix on every worker."""
+        for worker in self.workers:
+            worker.cache_prefix(prefix)
+
+    def generate_response(self, prompt: str, max_tokens: int = 512) -> str:
+        """Generate a full response on the next available worker."""
+        with self.acquire() as llm:
+            return llm.generate_response(prompt, max_tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth and throughput counters."""
+        with self._lock:
+            started, completed = self._started, self._completed
+            return {
+                "workers": self.num_workers,
+                "active": self._active,
+                "queue_depth": self._pending - self._active,
+                "max_queue_depth": self._max_queue_depth,
+                "queue_capacity": self.max_queue_size,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(self._total_wait / started, 3) if started else 0.0,
+                "avg_run_seconds": round(self._total_run / completed, 3) if completed else 0.0
+            }
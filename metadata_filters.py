@@ -0,0 +1,112 @@
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+from config import Config
+
+# Tags are stored as one key per tag, since metadata values cannot be lists
+TAG_PREFIX = "tag_"
+# Filters that match a metadata field directly, with one value or a list of alternatives
+FIELD_FILTERS = ("source", "source_type", "extension")
+DATE_FILTERS = {"ingested_after": "$gte", "ingested_before": "$lt"}
+FILTERS = frozenset(FIELD_FILTERS) | frozenset(DATE_FILTERS) | {"tags"}
+
+def tag_key(tag: str) -> str:
+    """Metadata key marking a chunk with a tag."""
+    return TAG_PREFIX + re.sub(r'[^a-z0-9]+', '_', str(tag).lower()).strip('_')
+
+def source_metadata(source: str) -> Dict[str, Any]:
+    """Filterable metadata shared by all chunks of a source.
+
+    source_type is "file", "url" or "youtube"; extension is the lower-case
+    file extension without the dot ("" if none); ingested_at is a Unix
+    timestamp. Files are tagged with the folders they sit in below
+    DATA_DIR, so data/documents/nist/usb/guide.pdf gets "nist" and "usb".
+    """
+    metadata = {"ingested_at": int(time.time())}
+    if source.startswith(("http://", "https://")):
+        metadata["source_type"] = "youtube" if 'youtube.com/' in source or 'youtu.be/' in source else "url"
+        path = urlsplit(source).path
+    else:
+        metadata["source_type"] = "file"
+        path = source
+        relative = os.path.relpath(os.path.dirname(os.path.abspath(source)), os.path.abspath(Config.DATA_DIR))
+        if not relative.startswith(os.pardir):
+            for folder in relative.split(os.sep):
+                if folder != os.curdir and tag_key(folder) != TAG_PREFIX:
+                    metadata[tag_key(folder)] = 1
+    metadata["extension"] = os.path.splitext(path)[1].lstrip('.').lower()
+    return metadata
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r} (expected a Unix timestamp or ISO date)")
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate query filters into a vector store where clause (None when nothing is filtered).
+
+    filters may hold "source", "source_type" and "extension" (a value or a
+    list of alternatives), "tags" (chunks must carry all of them) and
+    "ingested_after"/"ingested_before" (Unix timestamps or ISO dates).
+    Raises ValueError for unknown filters or invalid values.
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(filters) - FILTERS
+    if unknown:
+        raise ValueError(f"Unknown filter: {', '.join(sorted(unknown))} (expected {', '.join(sorted(FILTERS))})")
+
+    clauses = []
+    for field in FIELD_FILTERS:
+        values = filters.get(field)
+        if values in (None, "", []):
+            continue
+        values = [str(value) for value in (values if isinstance(values, (list, tuple)) else [values])]
+        if field == "extension":
+            values = [value.lstrip('.').lower() for value in values]
+        clauses.append({field: values[0]} if len(values) == 1 else {field: {"$in": values}})
+    tags = filters.get("tags") or []
+    for tag in [tags] if isinstance(tags, str) else tags:
+        clauses.append({tag_key(tag): 1})
+    for name, operator in DATE_FILTERS.items():
+        if filters.get(name) not in (None, ""):
+            clauses.append({"ingested_at": {operator: _timestamp(filters[name])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def collect_facets(metadatas: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Chunk counts per filterable value, for building filter pickers."""
+    sources: Dict[str, Dict[str, Any]] = {}
+    facets = {"chunks": 0, "source_types": {}, "extensions": {}, "tags": {}}
+    first = last = None
+    for metadata in metadatas:
+        facets["chunks"] += 1
+        source = metadata.get("source", "Unknown")
+        entry = sources.get(source)
+        if entry is None:
+            entry = sources[source] = {"source": source, "source_type": metadata.get("source_type"), "chunks": 0}
+        entry["chunks"] += 1
+        for field, counts in (("source_type", facets["source_types"]), ("extension", facets["extensions"])):
+            if field in metadata:
+                counts[metadata[field]] = counts.get(metadata[field], 0) + 1
+        for key in metadata:
+            if key.startswith(TAG_PREFIX):
+                tag = key[len(TAG_PREFIX):]
+                facets["tags"][tag] = facets["tags"].get(tag, 0) + 1
+        ingested_at = metadata.get("ingested_at")
+        if ingested_at is not None:
+            first = ingested_at if first is None else min(first, ingested_at)
+            last = ingested_at if last is None else max(last, ingested_at)
+    facets["sources"] = sorted(sources.values(), key=lambda entry: entry["source"])
+    facets["ingested_at"] = {"first": first, "last": last}
+    return facets
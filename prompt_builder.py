@@ -0,0 +1,102 @@
+from typing import List, Dict, Optional, Tuple
+from config import Config
+
+class PromptBuilder:
+    """Assembles prompts that always fit the model's context window.
+
+    The n_ctx budget is split, in priority order, between the generation
+    reservation, the static system text, the current question, retrieved
+    chunks (best-ranked first) and the conversation history (newest first).
+    History gets up to PROMPT_HISTORY_SHARE of what is left, the chunks get
+    the rest, and history can use any budget the chunks leave unused. When
+    something has to give, the lowest-ranked chunk is truncated or dropped
+    and the oldest messages go first. Token counts come from the GGUF model's
+    own tokenizer and are cached per text, so repeated chunks and history are
+    only tokenized once.
+    """
+
+    def __init__(self, llm, system_prompt: str, n_ctx: Optional[int] = None,
+                 max_new_tokens: Optional[int] = None):
+        self.llm = llm
+        self.system_prompt = system_prompt
+        self.n_ctx = n_ctx or Config.MAX_CONTEXT_LENGTH
+        self.max_new_tokens = max_new_tokens or Config.MAX_NEW_TOKENS
+        self.history_share = Config.PROMPT_HISTORY_SHARE
+        self.safety_tokens = Config.PROMPT_SAFETY_TOKENS
+
+    def build(self, question: str, documents: List[str],
+              messages: List[Dict[str, str]]) -> Tuple[str, int]:
+        """Return the prompt and how many of the ranked documents it includes."""
+        # +1 for the BOS token llama.cpp adds
+        budget = (self.n_ctx - self.max_new_tokens - self.safety_tokens - 1
+                  - self.llm.count_tokens(self.system_prompt))
+        for _ in range(3):
+            prompt, included = self._assemble(question, documents, messages, budget)
+            excess = self.llm.count_tokens(prompt) + 1 + self.max_new_tokens - self.n_ctx
+            if excess <= 0:
+                return prompt, included
+            # Pieces tokenize slightly differently once joined; shrink and retry
+            budget -= excess + self.safety_tokens
+        return prompt, included
+
+    def _assemble(self, question: str, documents: List[str],
+                  messages: List[Dict[str, str]], budget: int) -> Tuple[str, int]:
+        question_part = self._question_part(question)
+        question_tokens = self.llm.count_tokens(question_part)
+        if question_tokens > budget // 2:
+            # Pathologically long question: keep its start
+            question = self.llm.truncate_to_tokens(question, budget // 2)
+            question_part = self._question_part(question)
+            question_tokens = self.llm.count_tokens(question_part)
+        remaining = max(0, budget - question_tokens)
+
+        history_tokens = [self.llm.count_tokens(self._format_message(msg)) for msg in messages]
+        history_budget = min(sum(history_tokens), int(remaining * self.history_share))
+
+        context_parts = []
+        context_budget = remaining - history_budget
+        for i, doc in enumerate(documents):
+            part = self._document_part(i, doc)
+            tokens = self.llm.count_tokens(part)
+            if tokens <= context_budget:
+                context_parts.append(part)
+                context_budget -= tokens
+                continue
+            # Truncate the first document that does not fit; lower-ranked ones are dropped
+            overhead = self.llm.count_tokens(self._document_part(i, ""))
+            if context_budget - overhead >= 32:
+                part = self._document_part(i, self.llm.truncate_to_tokens(doc, context_budget - overhead))
+                context_parts.append(part)
+                context_budget -= self.llm.count_tokens(part)
+            break
+
+        # History may also use whatever the documents left unused
+        history_budget += max(0, context_budget)
+        kept = []
+        for msg, tokens in zip(reversed(messages), reversed(history_tokens)):
+            if tokens > history_budget:
+                break
+            kept.append(msg)
+            history_budget -= tokens
+        conversation_context = "\n\n".join(self._format_message(msg) for msg in reversed(kept))
+
+        context = "\n\n".join(context_parts)
+        prompt = self.system_prompt + f"""{context}
+
+{'Previous Conversation:' if conversation_context else ''}
+{conversation_context}
+
+{question_part}"""
+        return prompt, len(context_parts)
+
+    @staticmethod
+    def _question_part(question: str) -> str:
+        return f"Current Question: {question}\n\nAssistant: "
+
+    @staticmethod
+    def _document_part(index: int, doc: str) -> str:
+        return f"[Document {index + 1}]: {doc}"
+
+    @staticmethod
+    def _format_message(msg: Dict[str, str]) -> str:
+        return f"{msg['role'].capitalize()}: {msg['content']}"
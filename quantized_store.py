@@ -0,0 +1,294 @@
+import os
+import threading
+from typing import Collection, List, Dict, Any, Optional, Tuple
+import numpy as np
+from config import Config
+
+QUANTIZED_DIR = "quantized"
+META_FILE = "meta.npz"
+DTYPES = {"int8": np.int8, "float16": np.float16}
+# Rows converted to float32 at a time while scanning (bounds the temporary)
+SEARCH_BLOCK_ROWS = 16384
+
+class QuantizedVectorStore:
+    """Compact copy of the vector store's embeddings for memory-lean search.
+
+    Vectors are kept as int8 (with a float32 scale per vector) or float16 in
+    a memory-mapped array, 4x or 2x smaller than float32. A search scans the
+    quantized array with blocked matrix products to shortlist
+    QUANTIZED_RESCORE_FACTOR candidates per result, then rescores those
+    exactly against float32 copies that stay on disk and are only paged in
+    for the shortlisted rows. Distances are squared L2, like the vector stores'.
+
+    The vector store remains the source of truth for documents and metadata;
+    this store only maps chunk IDs to vectors. Rows are appended to the data
+    files and removed rows are tombstoned; save() writes the row table
+    atomically and rewrites the files under a new generation once too many
+    rows are dead, so readers in other processes never see a half-written
+    index.
+    """
+
+    def __init__(self, path: Optional[str] = None, dtype: Optional[str] = None):
+        self.path = path or os.path.join(Config.VECTOR_DB_PATH, QUANTIZED_DIR)
+        self.default_dtype = dtype or Config.QUANTIZED_DTYPE
+        if self.default_dtype not in DTYPES:
+            raise ValueError(f"Unsupported QUANTIZED_DTYPE: {self.default_dtype}")
+        self.rescore_factor = max(1, Config.QUANTIZED_RESCORE_FACTOR)
+        self._lock = threading.RLock()
+        self._file_marker = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.dtype = self.default_dtype
+        self._dim = 0
+        self._generation = 0
+        self._count = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes = self._scales = self._norms = self._full = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def clear(self):
+        with self._lock:
+            generation = self._generation
+            self._reset()
+            self._generation = generation + 1
+            self._dirty = True
+
+    def add(self, ids: List[str], embeddings: List[List[float]]):
+        """Append vectors; re-adding an existing id replaces it."""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if not self._dim:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self._dim}")
+            self.remove([doc_id for doc_id in ids if doc_id in self._rows])
+            codes, scales, norms = self._quantize(vectors)
+            os.makedirs(self.path, exist_ok=True)
+            self._append("codes", codes)
+            self._append("scales", scales)
+            self._append("norms", norms)
+            self._append("full", vectors)
+            for doc_id in ids:
+                self._rows[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._count += len(ids)
+            self._open_arrays()
+            self._dirty = True
+
+    def remove(self, ids: List[str]):
+        """Tombstone vectors; their rows are dropped when the files are next compacted."""
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._dirty = True
+
+    def search(self, query_embeddings: List[List[float]], n_results: int,
+               allowed: Optional[Collection[str]] = None) -> List[Tuple[List[str], List[float]]]:
+        """Return (ids, squared L2 distances) per query, nearest first.
+
+        With allowed, only those ids are searched (metadata filters).
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        with self._lock:
+            alive = self._alive
+            if allowed is not None:
+                alive = np.zeros(self._count, dtype=bool)
+                alive[[self._rows[doc_id] for doc_id in allowed if doc_id in self._rows]] = True
+            live = int(alive.sum())
+            if not live or not len(queries) or n_results <= 0:
+                return [([], []) for _ in range(len(queries))]
+            n_results = min(n_results, live)
+            shortlist = min(live, n_results * self.rescore_factor)
+            candidates = self._shortlist(queries, shortlist, alive)
+
+            results = []
+            for query, rows in zip(queries, candidates):
+                rows = np.sort(rows)  # sequential reads from the float32 file
+                full = np.asarray(self._full[rows])
+                distances = (full * full).sum(axis=1) - 2 * (full @ query) + query @ query
+                order = np.argsort(distances, kind="stable")[:n_results]
+                results.append(([self._ids[rows[i]] for i in order],
+                                [float(max(0.0, distances[i])) for i in order]))
+            return results
+
+    def _shortlist(self, queries: np.ndarray, k: int, live: np.ndarray) -> List[np.ndarray]:
+        """Top-k rows per query by approximate (quantized) L2 distance, among the live rows."""
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self._count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, self._count)
+            alive = live[start:end]
+            if not alive.any():
+                continue
+            block = np.asarray(self._codes[start:end], dtype=np.float32)
+            scores = queries @ block.T
+            if self.dtype == "int8":
+                scores *= self._scales[start:end]
+            # q.x - |x|^2 / 2 ranks rows like -|q - x|^2 does
+            scores -= 0.5 * self._norms[start:end]
+            scores[:, ~alive] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))],
+                                  axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+        return [row[np.isfinite(score)] for row, score in zip(best_rows, best_scores)]
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Codes, per-vector scales and squared norms of the dequantized vectors."""
+        if self.dtype == "float16":
+            codes = vectors.astype(np.float16)
+            scales = np.ones(len(vectors), dtype=np.float32)
+        else:
+            # Symmetric per-vector scale: the largest component maps to +-127
+            scales = (np.abs(vectors).max(axis=1) / 127.0).astype(np.float32)
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        approx = codes.astype(np.float32) * scales[:, None]
+        return codes, scales, (approx * approx).sum(axis=1)
+
+    def save(self) -> bool:
+        """Write the row table (compacting first if needed); returns False if nothing changed."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            os.makedirs(self.path, exist_ok=True)
+            if self._count and len(self._rows) < 0.75 * self._count:
+                self._compact()
+            meta_path = os.path.join(self.path, META_FILE)
+            tmp_path = f"{meta_path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                ids=np.array(self._ids, dtype=str),
+                alive=self._alive,
+                dtype=np.array(self.dtype),
+                dim=np.array(self._dim),
+                generation=np.array(self._generation),
+                count=np.array(self._count)
+            )
+            os.replace(tmp_path, meta_path)
+            self._file_marker = self._stat()
+            self._dirty = False
+            self._remove_old_generations()
+            return True
+
+    def reload_if_changed(self) -> bool:
+        """Pick up a newer store written by another process (e.g. ingestion)."""
+        marker = self._stat()
+        if marker == self._file_marker:
+            return False
+        with self._lock:
+            self._reset()
+            self._load()
+        return True
+
+    def warm_up(self):
+        """Page in the quantized vectors so the first scans do not fault them in."""
+        with self._lock:
+            for start in range(0, self._count, SEARCH_BLOCK_ROWS):
+                float(self._codes[start:start + SEARCH_BLOCK_ROWS].sum(dtype=np.float32))
+            if self._count:
+                float(self._scales.sum() + self._norms.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            row_bytes = self._dim * np.dtype(DTYPES[self.dtype]).itemsize + 8  # + scale and norm
+            return {
+                "vectors": len(self._rows),
+                "dtype": self.dtype,
+                "dimensions": self._dim,
+                "bytes_per_vector": row_bytes,
+                "float32_bytes_per_vector": self._dim * 4,
+                "dead_rows": self._count - len(self._rows)
+            }
+
+    def _compact(self):
+        """Rewrite live rows into files of the next generation."""
+        live = np.flatnonzero(self._alive)
+        generation = self._generation + 1
+        for name in ("codes", "scales", "norms", "full"):
+            source = getattr(self, f"_{name}")
+            with open(self._file(name, generation), "wb") as f:
+                for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(source[live[start:start + SEARCH_BLOCK_ROWS]]).tobytes())
+        self._ids = [self._ids[row] for row in live]
+        self._rows = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._alive = np.ones(len(live), dtype=bool)
+        self._count = len(live)
+        self._generation = generation
+        self._open_arrays()
+
+    def _remove_old_generations(self):
+        for name in os.listdir(self.path):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[1] != str(self._generation):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass  # still mapped by a reader on some platforms; removed next time
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self._generation if generation is None else generation
+        suffix = self.dtype if name == "codes" else "f32"
+        return os.path.join(self.path, f"{name}.{generation}.{suffix}")
+
+    def _append(self, name: str, array: np.ndarray):
+        # Overwrites whatever an interrupted run left past the last saved row
+        path = self._file(name)
+        row_bytes = array.nbytes // len(array)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            f.seek(self._count * row_bytes)
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate()
+
+    def _open_arrays(self):
+        if not self._count:
+            self._codes = self._scales = self._norms = self._full = None
+            return
+        self._codes = np.memmap(self._file("codes"), dtype=DTYPES[self.dtype], mode="r",
+                                shape=(self._count, self._dim))
+        self._scales = np.memmap(self._file("scales"), dtype=np.float32, mode="r", shape=(self._count,))
+        self._norms = np.memmap(self._file("norms"), dtype=np.float32, mode="r", shape=(self._count,))
+        self._full = np.memmap(self._file("full"), dtype=np.float32, mode="r",
+                               shape=(self._count, self._dim))
+
+    def _stat(self):
+        try:
+            stat = os.stat(os.path.join(self.path, META_FILE))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        self._file_marker = self._stat()
+        if self._file_marker is None:
+            return
+        try:
+            with np.load(os.path.join(self.path, META_FILE)) as meta:
+                self._ids = meta["ids"].tolist()
+                self._alive = meta["alive"].astype(bool)
+                self.dtype = str(meta["dtype"])
+                self._dim = int(meta["dim"])
+                self._generation = int(meta["generation"])
+                self._count = int(meta["count"])
+            self._open_arrays()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading quantized vector store {self.path}: {e}")
+            self._reset()
+            return
+        self._rows = {doc_id: i for i, doc_id in enumerate(self._ids) if self._alive[i]}
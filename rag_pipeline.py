@@ -1,91 +1,533 @@
-from typing import List, Dict, Any, Tuple
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
-from llm_model import LocalLLM, ConversationManager
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Tuple, Iterator, Optional
+from embedding_service import get_embedding_service
+from cache import LRUCache, normalize_query, get_index_generation
+from llm_model import ERROR_RESPONSE
+from llm_pool import LLMWorkerPool, QueueFullError
+from answer_cache import SemanticAnswerCache
+from conversation_store import create_conversation_store
+from prompt_builder import PromptBuilder
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from metadata_filters import build_where, collect_facets
+from quantized_store import QuantizedVectorStore
+from vector_store import create_vector_store
 from config import Config
 
+# Session used by callers that do not track sessions (scripts, tests)
+DEFAULT_SESSION = "default"
+
+# Static preamble shared by every prompt; kept first so it can be prefix-cached
+SYSTEM_PROMPT = """You are a cyber-forensics expert assistant. Help investigators with questions about hardware, USBs, cameras, system analysis, and digital forensics.
+
+Instructions:
+- Provide clear, technical answers suitable for investigators
+- Cite sources when referring to specific documents
+- Be precise and factual
+- If unsure, say so and suggest where to find more information
+
+Use the following context information to answer the question. If the context doesn't contain relevant information, use your knowledge but be clear about the limitations.
+
+Context Information:
+"""
+
+ANSWER_CACHE_FILE = "answer_cache.db"
+# Chunks read per vector store call when computing facets
+FACETS_PAGE_SIZE = 1000
+
+# Synthetic questions run by warm_up() to exercise the whole retrieval path
+WARMUP_QUESTIONS = [
+    "How do I identify USB devices connected to a Windows system?",
+    "Which registry keys record recently used files?",
+    "How can camera metadata be extracted from an image?",
+    "What tools are used for disk image analysis?",
+    "How are browser history artifacts recovered?"
+]
+
 class RAGPipeline:
     def __init__(self):
-        self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
-        self.llm = LocalLLM()
-        self.conversation_manager = ConversationManager(self.llm)
+        self.embeddings = get_embedding_service()
+        self.embedding_cache = LRUCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL)
+        self.retrieval_cache = LRUCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL)
+        # Chunk ids matching a metadata filter, for searches outside the vector store
+        self.filter_cache = LRUCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL)
+        self._facets = None
+        self._cache_generation = get_index_generation()
+        self.answer_cache = None
+        if Config.ANSWER_CACHE_ENABLED:
+            persist_path = (os.path.join(Config.VECTOR_DB_PATH, ANSWER_CACHE_FILE)
+                            if Config.ANSWER_CACHE_PERSIST else None)
+            self.answer_cache = SemanticAnswerCache(persist_path=persist_path)
+        self.llm_pool = LLMWorkerPool()
+        if Config.PROMPT_PREFIX_CACHE:
+            self.llm_pool.cache_prefix(SYSTEM_PROMPT)
+        self.conversation_store = create_conversation_store(self.llm_pool.workers[0])
+        self.prompt_builder = PromptBuilder(self.llm_pool.workers[0], SYSTEM_PROMPT)
+        self.lexical_index = LexicalIndex() if Config.HYBRID_SEARCH else None
+        self.reranker = None
+        if Config.RERANK_ENABLED:
+            from reranker import CrossEncoderReranker
+            self.reranker = CrossEncoderReranker()
         
         # Initialize vector database
-        self.client = PersistentClient(path=Config.VECTOR_DB_PATH)
-        self.collection = self.client.get_collection(
-            Config.COLLECTION_NAME,
-            embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=Config.EMBEDDING_MODEL
-            )
-        )
+        self.vector_store = create_vector_store(embedding_function=self.embeddings, create=False)
+        self.quantized_store = None
+        if Config.SEARCH_BACKEND == "quantized":
+            self.quantized_store = QuantizedVectorStore()
+            if not len(self.quantized_store) and self.vector_store.count():
+                print("Quantized vector store is empty; run ingest_data.py to build it. "
+                      "Searching the vector store until then.")
+        
+        # Set once warm_up() has run (or immediately when warm-up is disabled)
+        self.ready = threading.Event()
+        self.warmup_seconds = None
+        self.warmup_error = None
+        if not Config.WARMUP_ON_START:
+            self.ready.set()
     
-    def query(self, question: str) -> Tuple[str, List[Dict]]:
-        """Process a query and return response with sources."""
-        # Retrieve relevant documents
-        results = self.collection.query(
-            query_texts=[question],
-            n_results=Config.TOP_K_RESULTS
-        )
+    def query(self, question: str, session_id: str = DEFAULT_SESSION,
+              filters: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Dict], bool]:
+        """Process a query and return response, sources and whether the answer came from cache.
         
-        # Format context from retrieved documents
-        context, sources = self._format_context(results)
+        filters restrict retrieval to matching chunks (see metadata_filters.build_where).
+        """
+        prompt, sources, cache_key = self._prepare_query(question, session_id, build_where(filters))
         
-        # Build prompt with conversation history and context
-        prompt = self._build_prompt(question, context)
+        cached = self._lookup_answer(cache_key)
+        if cached:
+            response, sources = cached["response"], cached["sources"]
+        else:
+            # Generate response on the next free LLM worker
+            response = self.llm_pool.generate_response(prompt, Config.MAX_NEW_TOKENS)
+            self._store_answer(cache_key, question, response, sources)
         
-        # Generate response
-        response = self.llm.generate_response(prompt)
+        # Update conversation history, unless generation failed
+        if response != ERROR_RESPONSE:
+            self.conversation_store.add_exchange(session_id, question, response)
+        
+        return response, sources, cached is not None
+    
+    def query_stream(self, question: str, session_id: str = DEFAULT_SESSION,
+                     filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Process a query, yielding the sources first and then response tokens as they arrive.
+        
+        Events are dicts with a "type" of "sources", "token" or "done"; the
+        "done" event carries the cleaned full response and a "cached" flag. A
+        worker is reserved before the sources are yielded, so QueueFullError
+        surfaces on the first next() call rather than mid-stream. If generation
+        fails part way, the answer is neither cached nor added to the session.
+        """
+        prompt, sources, cache_key = self._prepare_query(question, session_id, build_where(filters))
+        
+        cached = self._lookup_answer(cache_key)
+        failed = False
+        if cached:
+            response = cached["response"]
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "token", "text": response}
+        else:
+            with self.llm_pool.acquire() as llm:
+                yield {"type": "sources", "sources": sources}
+                
+                pieces = []
+                for text in llm.generate_stream(prompt, Config.MAX_NEW_TOKENS):
+                    # generate_stream reports an error as a final ERROR_RESPONSE piece,
+                    # possibly after part of the answer
+                    failed = failed or text == ERROR_RESPONSE
+                    pieces.append(text)
+                    yield {"type": "token", "text": text}
+                
+                response = llm.clean_response("".join(pieces).strip())
+            if not failed:
+                self._store_answer(cache_key, question, response, sources)
         
         # Update conversation history
-        self.conversation_manager.add_message("user", question)
-        self.conversation_manager.add_message("assistant", response)
+        if not failed:
+            self.conversation_store.add_exchange(session_id, question, response)
+        
+        yield {"type": "done", "response": response, "cached": cached is not None}
+    
+    def query_batch(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """Answer independent questions together and return the results in input order."""
+        return sorted(self.query_batch_iter(questions), key=lambda result: result["index"])
+    
+    def query_batch_iter(self, questions: List[str]) -> Iterator[Dict[str, Any]]:
+        """Answer independent questions together, yielding each result as soon as it is ready.
+        
+        Questions are embedded in one batch and retrieved with one multi-query
+        search; identical questions (ignoring case and whitespace) are answered
+        once. Answers come from the answer cache where possible, and the rest
+        are generated on all LLM workers in parallel. Batch questions have no
+        conversation history and are not added to any session.
+        
+        Results are dicts with the question's "index", "question", "response",
+        "sources" and "cached", plus an "error" if it could not be answered.
+        """
+        groups: Dict[str, List[int]] = {}
+        for i, question in enumerate(questions):
+            groups.setdefault(normalize_query(question), []).append(i)
+        unique = [questions[indexes[0]] for indexes in groups.values()]
+        if not unique:
+            return
+        
+        embeddings = self._embed_queries(unique)
+        retrieved = self._retrieve_batch(unique, Config.TOP_K_RESULTS)
+        
+        def results_for(indexes: List[int], **fields) -> Iterator[Dict[str, Any]]:
+            for i in indexes:
+                yield {"index": i, "question": questions[i], **fields}
+        
+        jobs = []
+        for question, indexes, embedding, results in zip(unique, groups.values(), embeddings, retrieved):
+            documents = results['documents'][0] if results and results.get('documents') else []
+            prompt, included = self.prompt_builder.build(question, documents, [])
+            sources = self._format_sources(results)[:included]
+            cache_key = None
+            if self.answer_cache:
+                cache_key = (embedding, results['ids'][0] if results.get('ids') else [])
+            cached = self._lookup_answer(cache_key)
+            if cached:
+                yield from results_for(indexes, response=cached["response"],
+                                       sources=cached["sources"], cached=True)
+            else:
+                jobs.append((question, indexes, prompt, sources, cache_key))
+        if not jobs:
+            return
+        
+        # Never more in flight than there are workers, leaving queue room for interactive queries
+        executor = ThreadPoolExecutor(max_workers=self.llm_pool.num_workers)
+        futures = {
+            executor.submit(self.llm_pool.generate_response, prompt, Config.MAX_NEW_TOKENS): (question, indexes, sources, cache_key)
+            for question, indexes, prompt, sources, cache_key in jobs
+        }
+        try:
+            for future in as_completed(futures):
+                question, indexes, sources, cache_key = futures[future]
+                try:
+                    response = future.result()
+                except QueueFullError as e:
+                    yield from results_for(indexes, response=None, sources=sources, cached=False, error=str(e))
+                    continue
+                self._store_answer(cache_key, question, response, sources)
+                yield from results_for(indexes, response=response, sources=sources, cached=False)
+        finally:
+            # Caller stopped early (e.g. client disconnected): drop generations not yet started
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def _prepare_query(self, question: str, session_id: str,
+                       where: Optional[Dict] = None) -> Tuple[str, List[Dict], Optional[Tuple]]:
+        """Retrieve context for a question and build the LLM prompt.
+        
+        Also returns the (embedding, chunk_ids) key for the answer cache, or
+        None when the answer must not be served from or stored in the cache.
+        """
+        # Retrieve relevant documents
+        results = self._retrieve(question, Config.TOP_K_RESULTS, where)
+        
+        # Fit the ranked documents and conversation history into the context window
+        documents = results['documents'][0] if results and results.get('documents') else []
+        messages = self.conversation_store.get_messages(session_id)
+        prompt, included = self.prompt_builder.build(question, documents, messages)
+        
+        # Only cite the documents the model actually saw
+        sources = self._format_sources(results)[:included]
         
-        return response, sources
+        cache_key = None
+        if self.answer_cache and (Config.ANSWER_CACHE_WITH_HISTORY or not messages):
+            chunk_ids = results['ids'][0] if results.get('ids') else []
+            cache_key = (self._embed_query(question), chunk_ids)
+        return prompt, sources, cache_key
     
-    def _format_context(self, results: Dict) -> Tuple[str, List[Dict]]:
-        """Format retrieved context and extract sources."""
-        context_parts = []
+    def _lookup_answer(self, cache_key: Optional[Tuple]) -> Optional[Dict[str, Any]]:
+        """Find a stored answer for a near-duplicate question with the same retrieved chunks."""
+        if cache_key is None:
+            return None
+        return self.answer_cache.lookup(*cache_key)
+    
+    def _store_answer(self, cache_key: Optional[Tuple], question: str, response: str, sources: List[Dict]):
+        if cache_key is None or not response or response == ERROR_RESPONSE:
+            return
+        embedding, chunk_ids = cache_key
+        self.answer_cache.store(question, embedding, chunk_ids, response, sources)
+    
+    def _embed_query(self, question: str) -> List[float]:
+        """Embed a question, reusing the embedding of an identical earlier question."""
+        return self._embed_queries([question])[0]
+    
+    def _embed_queries(self, questions: List[str]) -> List[List[float]]:
+        """Embed questions in one batch, skipping those embedded before."""
+        keys = [normalize_query(question) for question in questions]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.embeddings.encode_queries([questions[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                self.embedding_cache.set(keys[i], embedding)
+        return embeddings
+    
+    def _retrieve(self, question: str, n_results: int, where: Optional[Dict] = None) -> Dict:
+        """Run the (hybrid) search for a question, cached per ingestion generation."""
+        return self._retrieve_batch([question], n_results, where)[0]
+    
+    def _sync_generation(self) -> int:
+        """Drop cached results and reload the indexes if ingestion has changed them."""
+        generation = get_index_generation()
+        if generation != self._cache_generation:
+            # Collection changed since results were cached
+            self.retrieval_cache.clear()
+            self.filter_cache.clear()
+            self._cache_generation = generation
+            self.vector_store.reload_if_changed()
+            if self.lexical_index is not None:
+                self.lexical_index.reload_if_changed()
+            if self.quantized_store is not None:
+                self.quantized_store.reload_if_changed()
+        return generation
+    
+    def _retrieve_batch(self, questions: List[str], n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Retrieve for several questions with one search, reusing cached results."""
+        generation = self._sync_generation()
+        where_key = json.dumps(where, sort_keys=True) if where else None
+        keys = [(normalize_query(question), n_results, generation, where_key) for question in questions]
+        retrieved = [self.retrieval_cache.get(key) for key in keys]
+        missing = [i for i, results in enumerate(retrieved) if results is None]
+        if missing:
+            # With a reranker, search wider and let it pick the best n_results
+            n_candidates = max(n_results, Config.RERANK_CANDIDATES) if self.reranker else n_results
+            searched = self._search([questions[i] for i in missing], n_candidates, where)
+            for i, results in zip(missing, searched):
+                if self.reranker:
+                    results = self._rerank(questions[i], results, n_results)
+                retrieved[i] = results
+                self.retrieval_cache.set(keys[i], results)
+        return retrieved
+    
+    def _rerank(self, question: str, results: Dict, n_results: int) -> Dict:
+        """Reorder candidates by cross-encoder score and keep the top n_results.
+        
+        Falls back to the retrieval order when the reranker skips the batch.
+        """
+        ids = results['ids'][0] if results.get('ids') else []
+        if not ids:
+            return results
+        scores = self.reranker.rerank(question, ids, results['documents'][0])
+        if scores is None:
+            order = list(range(min(n_results, len(ids))))
+        else:
+            order = sorted(range(len(ids)), key=lambda i: scores[i], reverse=True)[:n_results]
+        
+        reranked = {}
+        for field, value in results.items():
+            if isinstance(value, list) and value and isinstance(value[0], list) and len(value[0]) == len(ids):
+                reranked[field] = [[value[0][i] for i in order]]
+            else:
+                reranked[field] = value
+        if scores is not None:
+            reranked['rerank_scores'] = [[scores[i] for i in order]]
+        return reranked
+    
+    def _search(self, questions: List[str], n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """One multi-query vector search, fused with BM25 when the lexical index is available.
+        
+        A where filter is pushed down into the vector store query; BM25 hits
+        are restricted to the chunks it matches. Returns a
+        VectorStore.query-shaped dict per question.
+        """
+        hybrid = self.lexical_index is not None and len(self.lexical_index) > 0
+        candidates = max(n_results, Config.HYBRID_CANDIDATES) if hybrid else n_results
+        vector = self._vector_query(self._embed_queries(questions), candidates, where)
+        per_question = [
+            {field: [value[i]] if isinstance(value, list) and field != 'included' else value
+             for field, value in vector.items()}
+            for i in range(len(questions))
+        ]
+        if not hybrid:
+            return per_question
+        
+        fused_lists = []
+        records = {}
+        for question, results in zip(questions, per_question):
+            vector_ids = results['ids'][0] if results.get('ids') else []
+            allowed = self._allowed_ids(where) if where else None
+            lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(question, candidates, allowed)]
+            fused_lists.append(reciprocal_rank_fusion(
+                [(vector_ids, Config.VECTOR_WEIGHT), (lexical_ids, Config.BM25_WEIGHT)],
+                k=Config.RRF_K
+            )[:n_results])
+            for i, doc_id in enumerate(vector_ids):
+                records[doc_id] = (results['documents'][0][i], results['metadatas'][0][i],
+                                   results['distances'][0][i] if results.get('distances') else None)
+        
+        # Chunks found only by BM25 are fetched once, even when several questions share them
+        missing = list({doc_id for fused in fused_lists for doc_id, _ in fused if doc_id not in records})
+        if missing:
+            found = self.vector_store.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, doc, metadata in zip(found['ids'], found['documents'], found['metadatas']):
+                records[doc_id] = (doc, metadata, None)
+        
+        searched = []
+        for fused in fused_lists:
+            # Chunks deleted since the lexical index was saved are skipped
+            fused = [(doc_id, score) for doc_id, score in fused if doc_id in records]
+            searched.append({
+                'ids': [[doc_id for doc_id, _ in fused]],
+                'documents': [[records[doc_id][0] for doc_id, _ in fused]],
+                'metadatas': [[records[doc_id][1] for doc_id, _ in fused]],
+                'distances': [[records[doc_id][2] for doc_id, _ in fused]],
+                'scores': [[score for _, score in fused]]
+            })
+        return searched
+    
+    def _vector_query(self, query_embeddings: List[List[float]], n_results: int,
+                      where: Optional[Dict] = None) -> Dict:
+        """Nearest chunks per query embedding, shaped like VectorStore.query results.
+        
+        Uses the quantized store when it is enabled and built, fetching the
+        documents and metadata of all hits from the vector store in one call.
+        """
+        if self.quantized_store is None or not len(self.quantized_store):
+            return self.vector_store.query(query_embeddings, n_results, where=where)
+        
+        allowed = self._allowed_ids(where) if where else None
+        hits = self.quantized_store.search(query_embeddings, n_results, allowed)
+        wanted = list({doc_id for ids, _ in hits for doc_id in ids})
+        found = self.vector_store.get(ids=wanted, include=["documents", "metadatas"]) if wanted else {'ids': []}
+        records = {doc_id: (doc, metadata) for doc_id, doc, metadata
+                   in zip(found['ids'], found.get('documents') or [], found.get('metadatas') or [])}
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        for ids, distances in hits:
+            # Vectors whose chunk has since been deleted are skipped
+            kept = [(doc_id, distance) for doc_id, distance in zip(ids, distances) if doc_id in records]
+            results['ids'].append([doc_id for doc_id, _ in kept])
+            results['documents'].append([records[doc_id][0] for doc_id, _ in kept])
+            results['metadatas'].append([records[doc_id][1] for doc_id, _ in kept])
+            results['distances'].append([distance for _, distance in kept])
+        return results
+    
+    def _allowed_ids(self, where: Dict) -> frozenset:
+        """IDs of the chunks matching a filter, cached per ingestion generation."""
+        key = json.dumps(where, sort_keys=True)
+        allowed = self.filter_cache.get(key)
+        if allowed is None:
+            allowed = frozenset(self.vector_store.get(where=where, include=[])['ids'])
+            self.filter_cache.set(key, allowed)
+        return allowed
+    
+    def _format_sources(self, results: Dict) -> List[Dict]:
+        """Extract the sources of retrieved documents, in rank order."""
         sources = []
         
         if results and 'documents' in results and results['documents']:
-            for i, (doc, metadata) in enumerate(zip(results['documents'][0], 
-                                                  results['metadatas'][0])):
-                context_parts.append(f"[Document {i+1}]: {doc}")
-                sources.append({
+            for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
+                source = {
                     "content": doc,
                     "source": metadata.get('source', 'Unknown'),
                     "chunk_index": metadata.get('chunk_index', 0)
-                })
+                }
+                # Citation offsets recorded at ingestion (absent for older chunks)
+                for key in ("page_start", "page_end", "char_start", "char_end"):
+                    if key in metadata:
+                        source[key] = metadata[key]
+                sources.append(source)
         
-        return "\n\n".join(context_parts), sources
+        return sources
     
-    def _build_prompt(self, question: str, context: str) -> str:
-        """Build the prompt for the LLM."""
-        conversation_context = self.conversation_manager.get_conversation_context()
+    def get_chunk_window(self, source: str, chunk_index: int, radius: int = 1) -> List[Dict[str, Any]]:
+        """Return a chunk and its neighbours from the same source, in document order.
         
-        prompt = f"""You are a cyber-forensics expert assistant. Help investigators with questions about hardware, USBs, cameras, system analysis, and digital forensics.
-
-Use the following context information to answer the question. If the context doesn't contain relevant information, use your knowledge but be clear about the limitations.
-
-Context Information:
-{context}
-
-{'Previous Conversation:' if conversation_context else ''}
-{conversation_context}
-
-Current Question: {question}
-
-Instructions:
-- Provide clear, technical answers suitable for investigators
-- Cite sources when referring to specific documents
-- Be precise and factual
-- If unsure, say so and suggest where to find more information
-
-Assistant: """
+        Served straight from the vector store's metadata, so expanding a citation
+        never re-reads or re-chunks the original document.
+        """
+        radius = max(0, radius)
+        results = self.vector_store.get(
+            where={"$and": [
+                {"source": source},
+                {"chunk_index": {"$gte": chunk_index - radius}},
+                {"chunk_index": {"$lte": chunk_index + radius}}
+            ]},
+            include=["documents", "metadatas"]
+        )
+        window = []
+        for doc, metadata in zip(results.get('documents') or [], results.get('metadatas') or []):
+            window.append({"content": doc, **metadata})
+        window.sort(key=lambda chunk: chunk.get('chunk_index', 0))
+        return window
+    
+    def facets(self) -> Dict[str, Any]:
+        """Values that can be filtered on, with chunk counts; recomputed only after ingestion."""
+        generation = self._sync_generation()
+        facets = self._facets
+        if facets is None or facets[0] != generation:
+            def metadatas() -> Iterator[Dict[str, Any]]:
+                offset = 0
+                while True:
+                    page = self.vector_store.get(limit=FACETS_PAGE_SIZE, offset=offset, include=["metadatas"])
+                    yield from page['metadatas'] or []
+                    if len(page['ids']) < FACETS_PAGE_SIZE:
+                        return
+                    offset += FACETS_PAGE_SIZE
+            facets = self._facets = (generation, collect_facets(metadatas()))
+        return facets[1]
+    
+    def warm_up(self, num_queries: Optional[int] = None):
+        """Load the indexes and models and run synthetic queries, then mark the pipeline ready.
         
-        return prompt
+        Pages the vector files into memory, loads the index that serves
+        queries (the quantized store when it is in use, otherwise the vector
+        store's own, e.g. Chroma's HNSW index) and runs a few retrievals, so
+        the first real queries do not pay for cold caches. The synthetic
+        results are not cached. Errors
+        are reported but still mark the pipeline ready, since real queries
+        would simply warm up on demand.
+        """
+        num_queries = Config.WARMUP_QUERIES if num_queries is None else num_queries
+        questions = WARMUP_QUESTIONS[:max(1, num_queries)]
+        start = time.time()
+        try:
+            if self.quantized_store is not None and len(self.quantized_store):
+                # Queries never touch the vector store's own index, so leave it on disk
+                self.quantized_store.warm_up()
+            else:
+                self.vector_store.warm_up()
+            embeddings = self.embeddings.encode_queries(questions)
+            hybrid = self.lexical_index is not None and len(self.lexical_index) > 0
+            candidates = max(Config.TOP_K_RESULTS, Config.HYBRID_CANDIDATES) if hybrid else Config.TOP_K_RESULTS
+            results = self._vector_query(embeddings, candidates)
+            if hybrid:
+                for question in questions:
+                    self.lexical_index.search(question, candidates)
+            if self.reranker and results.get('ids') and results['ids'][0]:
+                self.reranker.rerank(questions[0], results['ids'][0], results['documents'][0])
+            self.warmup_seconds = round(time.time() - start, 3)
+            print(f"Warm-up finished in {self.warmup_seconds:.2f}s ({len(questions)} queries)")
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Error during warm-up: {e}")
+        finally:
+            self.ready.set()
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Runtime metrics for the inference queue."""
+        return {
+            "ready": self.ready.is_set(),
+            "warmup_seconds": self.warmup_seconds,
+            "llm_pool": self.llm_pool.metrics(),
+            "sessions": self.conversation_store.stats(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "retrieval_cache": self.retrieval_cache.stats(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "vector_store": self.vector_store.stats(),
+            "lexical_index": self.lexical_index.stats() if self.lexical_index is not None else None,
+            "quantized_store": self.quantized_store.stats() if self.quantized_store is not None else None,
+            "reranker": self.reranker.stats() if self.reranker else None
+        }
     
-    def clear_conversation(self):
-        """Clear conversation history."""
-        self.conversation_manager.clear_history()
\ No newline at end of file
+    def clear_conversation(self, session_id: str = DEFAULT_SESSION):
+        """Clear conversation history for one session."""
+        self.conversation_store.clear(session_id)
\ No newline at end of file
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import List, Dict, Any, Optional
+from sentence_transformers import CrossEncoder
+from cache import LRUCache, normalize_query
+from config import Config
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks against the question with a small cross-encoder.
+
+    All uncached (question, chunk) pairs are scored in one batch. Scores are
+    cached per normalized question and chunk ID, so follow-up and repeated
+    questions only score chunks they have not seen. A running estimate of the
+    cost per pair is kept, and re-ranking is skipped (keeping the retrieval
+    order) when a batch is predicted to exceed the latency budget.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, batch_size: Optional[int] = None,
+                 latency_budget_ms: Optional[float] = None):
+        self.model_name = model_name or Config.RERANK_MODEL
+        self.model = CrossEncoder(self.model_name, device="cpu")
+        self.batch_size = batch_size or Config.RERANK_BATCH_SIZE
+        self.latency_budget = (latency_budget_ms or Config.RERANK_LATENCY_BUDGET_MS) / 1000.0
+        self.score_cache = LRUCache(Config.RERANK_CACHE_SIZE)
+        self._lock = threading.Lock()  # one batch at a time; the model already uses every core
+        self._seconds_per_pair: Optional[float] = None
+        self.reranked = 0
+        self.skipped = 0
+        self._batches = 0
+        self._total_seconds = 0.0
+        self._last_seconds = 0.0
+
+    def rerank(self, question: str, ids: List[str], documents: List[str]) -> Optional[List[float]]:
+        """Return a relevance score per candidate, or None if re-ranking was skipped."""
+        key = normalize_query(question)
+        scores: List[Optional[float]] = [self.score_cache.get((key, doc_id)) for doc_id in ids]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
+            if (self._seconds_per_pair is not None
+                    and self._seconds_per_pair * len(missing) > self.latency_budget):
+                with self._lock:
+                    self.skipped += 1
+                    # Decay the estimate so a transient slowdown is retried eventually
+                    self._seconds_per_pair *= 0.9
+                return None
+            with self._lock:
+                started = time.perf_counter()
+                predicted = self.model.predict(
+                    [(question, documents[i]) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                elapsed = time.perf_counter() - started
+                per_pair = elapsed / len(missing)
+                # Smoothed so one slow batch does not disable re-ranking for good
+                self._seconds_per_pair = (per_pair if self._seconds_per_pair is None
+                                          else 0.8 * self._seconds_per_pair + 0.2 * per_pair)
+                self._batches += 1
+                self._total_seconds += elapsed
+                self._last_seconds = elapsed
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                self.score_cache.set((key, ids[i]), scores[i])
+
+        with self._lock:
+            self.reranked += 1
+        return scores
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "reranked": self.reranked,
+                "skipped_over_budget": self.skipped,
+                "latency_budget_ms": round(self.latency_budget * 1000, 1),
+                "last_batch_ms": round(self._last_seconds * 1000, 1),
+                "avg_batch_ms": round(self._total_seconds * 1000 / self._batches, 1) if self._batches else 0.0,
+                "est_ms_per_pair": round(self._seconds_per_pair * 1000, 2) if self._seconds_per_pair else None,
+                "score_cache": self.score_cache.stats()
+            }
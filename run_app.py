@@ -15,13 +15,20 @@
 #     # Run without debug mode to avoid console issues
 #     app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
 
-from app import app
+from app import app, rag_pipeline
 from waitress import serve
+from config import Config
 import os
 
 print("🔍 Starting Cyber-Forensics RAG System with Waitress...")
 print("🌐 Server: http://localhost:5000")
 print("⚡ Press Ctrl+C to stop")
 
-# Use Waitress instead of Flask dev server
-serve(app, host='0.0.0.0', port=5000)
\ No newline at end of file
+# Only accept traffic once the indexes are loaded and warm (see WARMUP_ON_START)
+if not rag_pipeline.ready.is_set():
+    print("⏳ Warming up indexes...")
+    rag_pipeline.ready.wait()
+
+# Use Waitress instead of Flask dev server. Request threads beyond the LLM
+# workers wait in the inference queue, which rejects with 429 when full.
+serve(app, host='0.0.0.0', port=5000, threads=Config.SERVER_THREADS)
\ No newline at end of file
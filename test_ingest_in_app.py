@@ -0,0 +1,75 @@
+import pytest
+
+import ingest_data
+import ingest_pipeline
+import utils
+from config import Config
+from document_watcher import DocumentWatcher
+
+# Large enough for iter_pdf_pages_parallel to use its process pool when allowed
+PDF_PAGES = 40
+
+class _FakeEmbeddings:
+    def encode_documents(self, documents):
+        return [[float(len(document)), 1.0, 0.0, 0.0] for document in documents]
+
+    def encode_queries(self, queries):
+        return self.encode_documents(queries)
+
+class _RecordingPool:
+    """Stands in for ProcessPoolExecutor and records that one was created."""
+
+    created = []
+
+    def __init__(self, *args, **kwargs):
+        _RecordingPool.created.append(kwargs.get("max_workers"))
+        raise RuntimeError("process pool started")
+
+@pytest.fixture
+def ingestor(tmp_path, monkeypatch):
+    data_dir = tmp_path / "documents"
+    data_dir.mkdir()
+    (data_dir / "guide.pdf").write_bytes(b"%PDF-1.4")
+    (data_dir / "notes.txt").write_text("Registry keys record recently used files. " * 40)
+
+    monkeypatch.setattr(Config, "DATA_DIR", str(data_dir))
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "vector_db"))
+    monkeypatch.setattr(Config, "NUMPY_STORE_PATH", str(tmp_path / "vector_db" / "numpy"))
+    monkeypatch.setattr(Config, "VECTOR_STORE", "numpy")
+    monkeypatch.setattr(Config, "SEARCH_BACKEND", "chroma")
+    monkeypatch.setattr(Config, "CHUNK_STRATEGY", "chars")
+    monkeypatch.setattr(Config, "PDF_PAGE_WORKERS", 4)
+    monkeypatch.setattr(ingest_data, "get_embedding_service", _FakeEmbeddings)
+    # PDF text without a PDF library: PDF_PAGES pages of one sentence each
+    monkeypatch.setattr(utils, "count_pdf_pages", lambda file_path: PDF_PAGES)
+    monkeypatch.setattr(utils, "iter_pdf_pages", lambda file_path, start_page=0, end_page=None: (
+        (page, f"Page {page} describes USB device artifacts in detail.")
+        for page in range(start_page, PDF_PAGES if end_page is None else end_page)
+    ))
+    monkeypatch.setattr(utils, "ProcessPoolExecutor", _RecordingPool)
+    monkeypatch.setattr(ingest_pipeline, "ProcessPoolExecutor", _RecordingPool)
+    _RecordingPool.created = []
+    return ingest_data.DataIngestor()
+
+def _indexed_sources(ingestor):
+    return {metadata["source"] for metadata in ingestor.vector_store.get(include=["metadatas"])["metadatas"]}
+
+def test_in_app_ingest_job_starts_no_process_pool(ingestor):
+    # What app._run_ingest_job runs
+    ingestor.process_documents(workers=1)
+
+    assert _RecordingPool.created == []
+    assert len(_indexed_sources(ingestor)) == 2
+
+def test_in_app_watcher_sync_starts_no_process_pool(ingestor):
+    # What the app's document watcher runs
+    DocumentWatcher(ingestor, workers=1).sync()
+
+    assert _RecordingPool.created == []
+    assert len(_indexed_sources(ingestor)) == 2
+
+def test_cli_ingest_uses_pdf_page_pool(ingestor):
+    # The recording pool refuses to start, so the PDF is reported as failed
+    ingestor.process_file(str(ingestor.discover_files()[0]))
+
+    assert _RecordingPool.created == [4]
@@ -0,0 +1,139 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import url_fetcher
+from url_fetcher import UrlFetcher
+
+# How long the stand-in server takes to answer, so concurrent requests overlap
+DELAY = 0.3
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+class _Handler(BaseHTTPRequestHandler):
+    """Local stand-in for the web: HTML pages with ETags, a Last-Modified page and non-text files."""
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers.get("Host", "")
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            server.in_flight[host] = server.in_flight.get(host, 0) + 1
+            server.max_per_host[host] = max(server.max_per_host.get(host, 0), server.in_flight[host])
+            server.total += 1
+            server.max_total = max(server.max_total, server.total)
+        try:
+            time.sleep(DELAY)
+            self._respond()
+        finally:
+            with server.lock:
+                server.in_flight[host] -= 1
+                server.total -= 1
+
+    def _respond(self):
+        if self.path.startswith("/page/"):
+            etag = f'"{self.path}-v1"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, headers={"ETag": etag})
+            else:
+                body = f"<html><body><main><p>Content of {self.path}.</p></main></body></html>"
+                self._send(200, body.encode(), "text/html; charset=utf-8", {"ETag": etag})
+        elif self.path == "/dated":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                self._send(304, headers={"Last-Modified": LAST_MODIFIED})
+            else:
+                self._send(200, b"Dated plain text.", "text/plain", {"Last-Modified": LAST_MODIFIED})
+        elif self.path == "/report.pdf":
+            self._send(200, b"%PDF-1.4\x00\x01\x02binary", "application/pdf")
+        elif self.path == "/data.json":
+            self._send(200, b'{"title": "JSON text"}', "application/json")
+        else:
+            self._send(404)
+
+    def _send(self, status, body=b"", content_type=None, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.in_flight, httpd.max_per_host = {}, {}
+    httpd.total = httpd.max_total = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "http_proxy", "https_proxy", "ALL_PROXY", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    return UrlFetcher(cache_dir=str(tmp_path), max_workers=6, per_host=2, timeout=10, retries=0)
+
+def _base(server, host="127.0.0.1"):
+    return f"http://{host}:{server.server_address[1]}"
+
+def test_fetches_concurrently_within_per_host_limit(server, fetcher):
+    # Two host names for the same server, so each gets its own limit
+    urls = [f"{_base(server, host)}/page/{i}" for host in ("127.0.0.1", "localhost") for i in range(4)]
+
+    results = dict(fetcher.fetch_all(urls))
+
+    assert sorted(results) == sorted(urls)
+    assert all(result.error is None and result.content for result in results.values())
+    assert max(server.max_per_host.values()) <= 2
+    assert server.max_total > 2
+
+def test_etag_304_is_served_from_cache_without_reparsing(server, fetcher, monkeypatch):
+    parsed = []
+    html_to_text = url_fetcher.html_to_text
+
+    def counting_html_to_text(content, encoding=None):
+        parsed.append(content)
+        return html_to_text(content, encoding)
+
+    monkeypatch.setattr(url_fetcher, "html_to_text", counting_html_to_text)
+    url = f"{_base(server)}/page/1"
+
+    first = dict(fetcher.fetch_texts([url]))[url]
+    second = dict(fetcher.fetch_texts([url]))[url]
+
+    assert "Content of /page/1." in first
+    assert second == first
+    assert len(parsed) == 1
+    assert server.requests[1][1].get("If-None-Match") == '"/page/1-v1"'
+    assert fetcher.fetch(url).from_cache
+
+def test_last_modified_304_is_served_from_cache(server, fetcher):
+    url = f"{_base(server)}/dated"
+
+    first = fetcher.fetch(url)
+    second = fetcher.fetch(url)
+
+    assert not first.from_cache
+    assert second.from_cache
+    assert server.requests[1][1].get("If-Modified-Since") == LAST_MODIFIED
+    assert second.text() == "Dated plain text."
+
+def test_non_text_responses_yield_no_text(server, fetcher):
+    pdf = fetcher.fetch(f"{_base(server)}/report.pdf")
+    data = fetcher.fetch(f"{_base(server)}/data.json")
+
+    assert pdf.content and not pdf.is_text()
+    assert pdf.text() == ""
+    assert data.is_text()
+    assert data.text() == '{"title": "JSON text"}'
@@ -0,0 +1,163 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Iterable, Tuple, Optional, Callable
+from utils import clean_text, chunk_pages, _page_at
+from config import Config
+
+# Whitespace after sentence-ending punctuation (text is already cleaned to single spaces)
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name: str):
+    """Load the embedding model's fast tokenizer once per process; None if unavailable."""
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    except Exception as e:
+        print(f"Could not load tokenizer for {model_name}, using character chunking: {e}")
+        return None
+    if not tokenizer.is_fast:
+        # Offset mappings (needed to split long sentences) require a fast tokenizer
+        print(f"No fast tokenizer for {model_name}, using character chunking")
+        return None
+    return tokenizer
+
+class TokenChunker:
+    """Packs whole sentences into chunks that fill the embedding model's token limit.
+
+    Sentences are tokenized in one batch per page/block, and consecutive
+    sentences are added to a chunk until the next one would exceed
+    max_tokens (minus the model's special tokens). The next chunk starts with
+    the trailing sentences of the previous one, up to overlap_tokens.
+    Sentences longer than the limit are split on token boundaries. Produces
+    the same records as utils.chunk_pages and, like it, keeps only the
+    unfinished tail of the document in memory.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int):
+        self.tokenizer = tokenizer
+        limit = max_tokens
+        if getattr(tokenizer, "model_max_length", None):
+            limit = min(limit, tokenizer.model_max_length)
+        self.max_tokens = max(8, limit - tokenizer.num_special_tokens_to_add())
+        self.overlap_tokens = min(max(0, overlap_tokens), self.max_tokens // 2)
+
+    def chunk_pages(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Dict[str, Any]]:
+        buffer = ""
+        offset = 0  # position of buffer[0] in the cleaned document
+        tail = 0  # start of the sentence still being read, in buffer
+        page_starts: List[Tuple[int, Optional[int]]] = []
+        # Sentences waiting to be chunked: [doc start, doc end, tokens]
+        pending: "deque[List[int]]" = deque()
+        state = {"tokens": 0, "carried": 0}  # carried: overlap sentences at the front of pending
+
+        def make_record(start: int, end: int) -> Dict[str, Any]:
+            record = {"text": buffer[start - offset:end - offset], "char_start": start, "char_end": end}
+            first_page = _page_at(page_starts, start)
+            if first_page is not None:
+                record["page_start"] = first_page
+                record["page_end"] = _page_at(page_starts, end - 1)
+            return record
+
+        for page_number, piece in pages:
+            piece = clean_text(piece)
+            if not piece:
+                continue
+            if buffer:
+                buffer += " "
+            page_starts.append((offset + len(buffer), page_number))
+            buffer += piece
+
+            # Only sentences followed by whitespace are complete; the last one may continue on the next page
+            spans = []
+            for match in _SENTENCE_BOUNDARY.finditer(buffer, tail):
+                spans.append((tail, match.start()))
+                tail = match.end()
+            self._add_sentences(buffer, offset, spans, pending, state)
+
+            while state["tokens"] > self.max_tokens:
+                start, end = self._take_chunk(pending, state)
+                if end - start >= 50:
+                    yield make_record(start, end)
+
+            keep_from = min(pending[0][0] - offset, tail) if pending else tail
+            buffer = buffer[keep_from:]
+            offset += keep_from
+            tail -= keep_from
+            while len(page_starts) > 1 and page_starts[1][0] <= offset:
+                page_starts.pop(0)
+
+        if buffer[tail:].strip():
+            self._add_sentences(buffer, offset, [(tail, len(buffer))], pending, state)
+        while len(pending) > state["carried"]:
+            start, end = self._take_chunk(pending, state)
+            if end - start >= 50:
+                yield make_record(start, end)
+
+    def _add_sentences(self, buffer: str, offset: int, spans: List[Tuple[int, int]],
+                       pending: "deque[List[int]]", state: Dict[str, int]):
+        """Tokenize sentences in one batch and queue them, splitting any that exceed the limit."""
+        spans = [span for span in spans if span[1] > span[0]]
+        if not spans:
+            return
+        encoded = self.tokenizer([buffer[start:end] for start, end in spans],
+                                 add_special_tokens=False, return_offsets_mapping=True)
+        for (start, end), offsets in zip(spans, encoded["offset_mapping"]):
+            if not offsets:
+                continue
+            if len(offsets) <= self.max_tokens:
+                pending.append([offset + start, offset + end, len(offsets)])
+                state["tokens"] += len(offsets)
+                continue
+            for i in range(0, len(offsets), self.max_tokens):
+                window = offsets[i:i + self.max_tokens]
+                pending.append([offset + start + window[0][0], offset + start + window[-1][1], len(window)])
+                state["tokens"] += len(window)
+
+    def _take_chunk(self, pending: "deque[List[int]]", state: Dict[str, int]) -> Tuple[int, int]:
+        """Remove the next chunk's sentences from pending, leaving its overlap behind."""
+        # Drop carried-over overlap that would leave no room for new text
+        carried_tokens = sum(pending[i][2] for i in range(state["carried"]))
+        while state["carried"] and carried_tokens + pending[state["carried"]][2] > self.max_tokens:
+            carried_tokens -= pending[0][2]
+            state["tokens"] -= pending.popleft()[2]
+            state["carried"] -= 1
+
+        count, tokens = 0, 0
+        for sentence in pending:
+            if count and tokens + sentence[2] > self.max_tokens:
+                break
+            tokens += sentence[2]
+            count += 1
+        start, end = pending[0][0], pending[count - 1][1]
+
+        # Keep trailing sentences (never the whole chunk) as the next chunk's overlap
+        keep, kept_tokens = 0, 0
+        for i in range(count - 1, 0, -1):
+            if kept_tokens + pending[i][2] > self.overlap_tokens:
+                break
+            kept_tokens += pending[i][2]
+            keep += 1
+        for _ in range(count - keep):
+            state["tokens"] -= pending.popleft()[2]
+        state["carried"] = keep
+        return start, end
+
+def _token_chunker() -> Optional[TokenChunker]:
+    tokenizer = get_tokenizer(Config.EMBEDDING_MODEL)
+    if tokenizer is None:
+        return None
+    return TokenChunker(tokenizer, Config.CHUNK_MAX_TOKENS, Config.CHUNK_OVERLAP_TOKENS)
+
+def active_strategy() -> str:
+    """The chunking strategy actually in use: "tokens" falls back to "chars" without a tokenizer."""
+    if Config.CHUNK_STRATEGY == "tokens" and get_tokenizer(Config.EMBEDDING_MODEL) is not None:
+        return "tokens"
+    return "chars"
+
+def get_chunker() -> Callable[[Iterable[Tuple[Optional[int], str]]], Iterator[Dict[str, Any]]]:
+    """Return the configured chunker: takes (page_number, text) pairs, yields chunk records."""
+    if active_strategy() == "tokens":
+        return _token_chunker().chunk_pages
+    return lambda pages: chunk_pages(pages, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from html_text import html_to_text
+from utils import extract_transcript_from_youtube
+from config import Config
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+# Content types read as plain text; anything else (PDFs, images, archives) is skipped
+TEXT_TYPES = ("text/", "json", "xml")
+
+class FetchResult:
+    """Raw response for a URL, possibly served from the on-disk cache."""
+
+    def __init__(self, url: str, content: bytes = b"", content_type: str = "",
+                 encoding: Optional[str] = None, from_cache: bool = False, error: Optional[str] = None,
+                 cached_text: Optional[str] = None):
+        self.url = url
+        self.content = content
+        self.content_type = content_type
+        self.encoding = encoding
+        self.from_cache = from_cache
+        self.error = error
+        self._text = cached_text
+
+    def is_text(self) -> bool:
+        """Whether the response is something text can be read from (HTML, text/*, JSON or XML)."""
+        if not self.content_type:
+            # Untyped: assume HTML unless the body looks binary
+            return b"\x00" not in self.content[:1024]
+        return "html" in self.content_type or any(kind in self.content_type for kind in TEXT_TYPES)
+
+    def text(self) -> str:
+        """Readable text of the response (HTML is reduced to its main content); "" for non-text responses."""
+        if self._text is None:
+            if self.error or not self.content:
+                self._text = ""
+            elif not self.is_text():
+                print(f"Skipping non-text response from {self.url} ({self.content_type or 'binary'})")
+                self._text = ""
+            elif "html" in self.content_type or not self.content_type:
+                self._text = html_to_text(self.content, self.encoding)
+            else:
+                self._text = self.content.decode(self.encoding or "utf-8", errors="ignore")
+        return self._text
+
+class UrlFetcher:
+    """Concurrent HTTP fetcher for URL ingestion.
+
+    One keep-alive requests.Session (with urllib3 retries and exponential
+    backoff on connection errors, 429 and 5xx) is shared by a thread pool,
+    and a semaphore per host caps concurrent requests to the same site. Raw
+    responses are cached on disk with their ETag/Last-Modified validators;
+    later fetches send a conditional request and reuse the cached body on
+    304 Not Modified, along with the text extracted from it last time, so
+    unchanged pages are neither downloaded nor parsed again.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_workers: Optional[int] = None,
+                 per_host: Optional[int] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None, session: Optional[requests.Session] = None):
+        self.cache_dir = cache_dir or Config.URL_CACHE_DIR
+        self.max_workers = max(1, max_workers or Config.URL_FETCH_WORKERS)
+        self.per_host = max(1, per_host or Config.URL_FETCH_PER_HOST)
+        self.timeout = timeout or Config.URL_FETCH_TIMEOUT
+        self.session = session or self._create_session(
+            Config.URL_FETCH_RETRIES if retries is None else retries
+        )
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _create_session(self, retries: int) -> requests.Session:
+        retry = Retry(
+            total=retries,
+            backoff_factor=Config.URL_FETCH_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=self.max_workers,
+                              pool_maxsize=self.max_workers)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = USER_AGENT
+        return session
+
+    def fetch(self, url: str) -> FetchResult:
+        """Fetch one URL, revalidating any cached copy."""
+        meta, body = self._read_cache(url)
+        headers = {}
+        if meta and body is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            with self._host_limit(url):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and body is not None:
+                return FetchResult(url, body, meta.get("content_type", ""), meta.get("encoding"),
+                                   from_cache=True, cached_text=self._read_cached_text(url))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Network error fetching {url}: {e}")
+            return FetchResult(url, error=str(e))
+
+        result = FetchResult(url, response.content, response.headers.get("Content-Type", "").lower(),
+                             response.encoding)
+        self._write_cache(url, response, result)
+        return result
+
+    def fetch_all(self, urls: List[str]) -> Iterator[Tuple[str, FetchResult]]:
+        """Fetch URLs concurrently, yielding (url, result) as each completes."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def fetch_texts(self, urls: List[str]) -> Iterator[Tuple[str, str]]:
+        """Fetch web pages and YouTube transcripts concurrently, yielding (url, text) as each completes."""
+        def load(url: str) -> str:
+            if 'youtube.com/' in url or 'youtu.be/' in url:
+                return extract_transcript_from_youtube(url)
+            result = self.fetch(url)
+            text = result.text()
+            if not result.from_cache:
+                self._write_cached_text(url, text)
+            return text
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(load, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result()
+                except Exception as e:
+                    print(f"Error extracting text from {url}: {e}")
+                    yield url, ""
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _cache_paths(self, url: str) -> Tuple[str, str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.json", f"{base}.body", f"{base}.txt"
+
+    def _read_cache(self, url: str) -> Tuple[Optional[Dict[str, Any]], Optional[bytes]]:
+        meta_path, body_path, _ = self._cache_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_cache(self, url: str, response: requests.Response, result: FetchResult):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            # Nothing to revalidate against
+            return
+        meta_path, body_path, text_path = self._cache_paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": result.content_type,
+            "encoding": result.encoding,
+            "fetched_at": time.time()
+        }
+        try:
+            # The text extracted from the previous body no longer applies
+            if os.path.exists(text_path):
+                os.remove(text_path)
+            # Body first, so a metadata file never points at a missing body
+            for path, data, mode in ((body_path, result.content, 'wb'),
+                                     (meta_path, json.dumps(meta), 'w')):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error caching response for {url}: {e}")
+
+    def _read_cached_text(self, url: str) -> Optional[str]:
+        try:
+            with open(self._cache_paths(url)[2], 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_cached_text(self, url: str, text: str):
+        meta_path, _, text_path = self._cache_paths(url)
+        if not os.path.exists(meta_path):
+            # The response was not cached
+            return
+        try:
+            tmp_path = f"{text_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, text_path)
+        except OSError as e:
+            print(f"Error caching text for {url}: {e}")
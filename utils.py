@@ -137,12 +137,14 @@ import re
 import json
 import PyPDF2
 import requests
-from bs4 import BeautifulSoup
 from youtube_transcript_api import YouTubeTranscriptApi
 from PIL import Image
 # import pytesseract
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Iterable, Tuple, Optional, Callable
+from concurrent.futures import ProcessPoolExecutor
+import bisect
 import hashlib
+from html_text import html_to_text
 
 # def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 100) -> List[str]:
 #     """Split text into overlapping chunks."""
@@ -174,13 +176,15 @@ import hashlib
     
 #     return chunks
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file with comprehensive error handling."""
-    text = ""
+def iter_pdf_pages(file_path: str, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) for each page with extractable text, one page at a time.
+    
+    Page numbers are 1-based; start_page/end_page select a 0-based half-open range.
+    """
     try:
         with open(file_path, 'rb') as file:
-            # Use context manager for better resource handling
-            reader = PyPDF2.PdfReader(file)
+            # Use PyPDF2 with strict=False to handle corrupted PDFs
+            reader = PyPDF2.PdfReader(file, strict=False)
             
             # Check if PDF is encrypted
             if reader.is_encrypted:
@@ -189,27 +193,85 @@ def extract_text_from_pdf(file_path: str) -> str:
                     reader.decrypt('')
                 except:
                     print(f"PDF is encrypted and cannot be read: {file_path}")
-                    return ""
+                    return
             
-            for page_num, page in enumerate(reader.pages):
+            end_page = len(reader.pages) if end_page is None else min(end_page, len(reader.pages))
+            for page_num in range(start_page, end_page):
                 try:
-                    page_text = page.extract_text()
+                    page_text = reader.pages[page_num].extract_text()
                     if page_text and page_text.strip():
-                        text += page_text + "\n"
+                        yield page_num + 1, page_text
                     else:
                         print(f"Page {page_num + 1} in {file_path} has no extractable text")
                 except Exception as page_error:
                     print(f"Error extracting text from page {page_num + 1} in {file_path}: {page_error}")
                     continue
-                
+                    
     except PyPDF2.errors.PdfReadError as e:
         print(f"PDF read error (corrupted file): {file_path}: {e}")
-        return ""
     except Exception as e:
         print(f"Unexpected error reading PDF {file_path}: {e}")
-        return ""
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF, or 0 if it cannot be read."""
+    try:
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            if reader.is_encrypted:
+                reader.decrypt('')
+            return len(reader.pages)
+    except Exception:
+        return 0
+
+def _extract_pdf_page_range(file_path: str, start_page: int, end_page: int) -> List[Tuple[int, str]]:
+    """Worker-process task for iter_pdf_pages_parallel."""
+    return list(iter_pdf_pages(file_path, start_page, end_page))
+
+def iter_pdf_pages_parallel(file_path: str, workers: int = 4, pages_per_task: int = 16) -> Iterator[Tuple[int, str]]:
+    """Like iter_pdf_pages, but extracts page ranges across a process pool.
     
-    return text
+    Pages are still yielded in order, and only a bounded window of ranges is
+    in flight at once, so memory does not grow with the size of the PDF.
+    """
+    page_count = count_pdf_pages(file_path)
+    if workers <= 1 or page_count <= pages_per_task:
+        yield from iter_pdf_pages(file_path)
+        return
+    
+    ranges = [(start, min(start + pages_per_task, page_count))
+              for start in range(0, page_count, pages_per_task)]
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract_pdf_page_range, file_path, *r) for r in ranges[:window]]
+        next_range = len(futures)
+        while futures:
+            pages = futures.pop(0).result()
+            if next_range < len(ranges):
+                futures.append(executor.submit(_extract_pdf_page_range, file_path, *ranges[next_range]))
+                next_range += 1
+            yield from pages
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """Extract text from PDF file with comprehensive error handling."""
+    return "".join(page_text + "\n" for _, page_text in iter_pdf_pages(file_path))
+
+def iter_text_file_blocks(file_path: str, block_size: int = 1 << 20) -> Iterator[str]:
+    """Read a text file in blocks that end on whitespace, so no word is split across blocks."""
+    carry = ""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            block = carry + block
+            cut = max(block.rfind(' '), block.rfind('\n'), block.rfind('\t'))
+            if cut == -1:
+                carry = block
+                continue
+            carry = block[cut + 1:]
+            yield block[:cut + 1]
+    if carry:
+        yield carry
 
 def extract_text_from_website(url: str) -> str:
     """Extract text from website."""
@@ -219,25 +281,7 @@ def extract_text_from_website(url: str) -> str:
         }
         response = requests.get(url, timeout=10, headers=headers)
         response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove unwanted elements
-        for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-            element.decompose()
-        
-        # Get text from main content areas
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
-        if main_content:
-            text = main_content.get_text()
-        else:
-            text = soup.get_text()
-        
-        # Clean up text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        return text
+        return html_to_text(response.content)
         
     except requests.RequestException as e:
         print(f"Network error extracting from {url}: {e}")
@@ -280,15 +324,15 @@ def generate_document_id(content: str, source: str) -> str:
     """Generate unique ID for document chunk."""
     return hashlib.md5(f"{content}_{source}".encode()).hexdigest()
 
+_NON_PRINTABLE = re.compile(r'[^\x20-\x7E]+')
+
 def clean_text(text: str) -> str:
     """Clean and normalize text."""
     if not text:
         return ""
     
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
-    # Remove non-printable characters (keep basic ASCII + newlines)
-    text = re.sub(r'[^\x20-\x7E\n\r]', '', text)
+    # Collapse whitespace, then remove non-printable characters (keep basic ASCII)
+    text = _NON_PRINTABLE.sub('', ' '.join(text.split()))
     return text.strip()
 
 # def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 100) -> List[str]:
@@ -445,6 +489,131 @@ def safe_chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 100,
     
     return chunks
 
+def chunk_stream(pieces: Iterable[str], chunk_size: int = 800, chunk_overlap: int = 100) -> Iterator[str]:
+    """Clean and chunk a stream of text pieces (e.g. PDF pages) incrementally.
+    
+    Produces the same chunks as clean_text + chunk_text on the concatenated
+    text, but only keeps the unfinished tail of the text in memory.
+    """
+    for chunk in chunk_pages(((None, piece) for piece in pieces), chunk_size, chunk_overlap):
+        yield chunk["text"]
+
+def chunk_pages(pages: Iterable[Tuple[Optional[int], str]], chunk_size: int = 800,
+                chunk_overlap: int = 100) -> Iterator[Dict[str, Any]]:
+    """Like chunk_stream, but takes (page_number, text) pairs and reports where each chunk came from.
+    
+    Yields dicts with the chunk "text", its "char_start"/"char_end" offsets in
+    the cleaned document text and, when page numbers are known, the
+    "page_start"/"page_end" it spans.
+    """
+    if chunk_size <= 0:
+        return
+    
+    buffer = ""
+    start = 0
+    offset = 0  # position of buffer[0] in the cleaned document
+    page_starts: List[Tuple[int, Optional[int]]] = []  # (document offset, page number)
+    
+    def make_record(chunk: str, chunk_start: int) -> Dict[str, Any]:
+        char_start = offset + chunk_start
+        record = {"text": chunk, "char_start": char_start, "char_end": char_start + len(chunk)}
+        first_page = _page_at(page_starts, char_start)
+        if first_page is not None:
+            record["page_start"] = first_page
+            record["page_end"] = _page_at(page_starts, record["char_end"] - 1)
+        return record
+    
+    for page_number, piece in pages:
+        piece = clean_text(piece)
+        if not piece:
+            continue
+        if buffer:
+            buffer += " "
+        page_starts.append((offset + len(buffer), page_number))
+        buffer += piece
+        
+        # Emit chunks while there is enough text after them for the sentence look-ahead
+        while start + chunk_size + 100 <= len(buffer):
+            chunk, chunk_start, next_start = _next_chunk(buffer, start, chunk_size, chunk_overlap)
+            if chunk:
+                yield make_record(chunk, chunk_start)
+            start = next_start
+        buffer = buffer[start:]
+        offset += start
+        start = 0
+        # Forget pages that lie entirely before the retained text
+        while len(page_starts) > 1 and page_starts[1][0] <= offset:
+            page_starts.pop(0)
+    
+    while start < len(buffer):
+        chunk, chunk_start, start = _next_chunk(buffer, start, chunk_size, chunk_overlap)
+        if chunk:
+            yield make_record(chunk, chunk_start)
+
+def _page_at(page_starts: List[Tuple[int, Optional[int]]], position: int) -> Optional[int]:
+    """Page number containing a document offset, given sorted (offset, page) starts."""
+    index = bisect.bisect_right([start for start, _ in page_starts], position) - 1
+    return page_starts[max(index, 0)][1] if page_starts else None
+
+def _next_chunk(text: str, start: int, chunk_size: int, chunk_overlap: int) -> Tuple[Optional[str], int, int]:
+    """One step of chunk_text.
+    
+    Returns the chunk starting at `start` (None if too short), the index of its
+    first non-space character and where the next chunk starts.
+    """
+    text_length = len(text)
+    end = min(start + chunk_size, text_length)
+    next_start = text_length
+    
+    if end < text_length:
+        # Look for a sentence boundary just past the window
+        segment = text[end:min(end + 100, text_length)]
+        break_pos = -1
+        for pos in (segment.find('. '), segment.find('? '), segment.find('! '), segment.find('\n')):
+            if pos != -1 and (break_pos == -1 or pos < break_pos):
+                break_pos = pos
+        if break_pos != -1:
+            end = end + break_pos + 1
+        next_start = max(end - chunk_overlap, start + chunk_size // 2)  # Ensure progress
+    
+    raw = text[start:end]
+    chunk = raw.strip()
+    chunk_start = start + len(raw) - len(raw.lstrip())
+    return (chunk if len(chunk) >= 50 else None), chunk_start, next_start
+
+def extract_file_chunks(file_path: str, chunk_size: int = 800, chunk_overlap: int = 100,
+                        page_workers: int = 1,
+                        chunker: Optional[Callable[[Iterable[Tuple[Optional[int], str]]],
+                                                   Iterator[Dict[str, Any]]]] = None) -> Iterator[Dict[str, Any]]:
+    """Extract, clean and chunk a local file, yielding chunk records (see chunk_pages).
+    
+    Text is streamed page by page (PDFs) or block by block (other files) into
+    the chunker (chunk_pages with chunk_size/chunk_overlap unless another is
+    given), and chunks are yielded as they are produced, so neither the
+    document's text nor its chunk list is ever held whole. page_workers > 1
+    splits large PDFs across a process pool; leave it at 1 when already
+    running inside a worker process. Self-contained so it can run in a worker
+    process during parallel ingestion.
+    """
+    if file_path.lower().endswith('.pdf'):
+        if page_workers > 1:
+            pages = iter_pdf_pages_parallel(file_path, page_workers)
+        else:
+            pages = iter_pdf_pages(file_path)
+    else:
+        pages = ((None, block) for block in iter_text_file_blocks(file_path))
+    
+    if chunker is None:
+        chunks = chunk_pages(pages, chunk_size, chunk_overlap)
+    else:
+        chunks = chunker(pages)
+    count = 0
+    for chunk in chunks:
+        count += 1
+        yield chunk
+    if not count:
+        print(f"No text extracted from {file_path}")
+
 def is_file_empty(file_path: str) -> bool:
     """Check if file is empty or contains only whitespace."""
     try:
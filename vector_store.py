@@ -0,0 +1,642 @@
+import abc
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
+from config import Config
+
+STORE_BACKENDS = ("chroma", "numpy")
+# Rows scored at a time by the NumPy store (bounds the temporary score matrix)
+SEARCH_BLOCK_ROWS = 16384
+# What Chroma uses when a collection's metadata does not say
+CHROMA_HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+# SQLite's default limit on bound parameters is 999
+_SQL_BATCH = 500
+
+class VectorStore(abc.ABC):
+    """Interface shared by the vector store backends.
+
+    Results use Chroma's shapes: get() returns {'ids', 'documents',
+    'metadatas', 'embeddings'} with flat lists (None for fields not in
+    `include`), and query() returns the same fields nested one list per query
+    embedding, plus 'distances' (squared L2). `where` filters take Chroma's
+    metadata syntax ($eq, $ne, $gt, $gte, $lt, $lte, $in, $nin, $and, $or).
+    """
+
+    backend = ""
+
+    @abc.abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of existing chunks, keeping their documents and embeddings."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int,
+              where: Optional[Dict] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self):
+        """Remove every chunk."""
+        raise NotImplementedError
+
+    def save(self) -> bool:
+        """Persist pending changes; returns False if there was nothing to write."""
+        return False
+
+    def reload_if_changed(self) -> bool:
+        """Pick up changes written by another process."""
+        return False
+
+    def warm_up(self):
+        """Load the index into memory ahead of the first query."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "chunks": self.count()}
+
+class ChromaVectorStore(VectorStore):
+    """The Chroma collection under Config.VECTOR_DB_PATH (HNSW index).
+
+    New collections are created with the HNSW_* parameters. Chroma copies
+    them into the HNSW segment when the collection is created and never
+    reads them again, so none of them (search_ef included) can be changed
+    on an existing collection; a mismatch is reported and the collection
+    must be rebuilt, e.g. by migrating out and back.
+    """
+
+    backend = "chroma"
+
+    def __init__(self, embedding_function=None, path: Optional[str] = None, create: bool = True):
+        from chromadb import PersistentClient
+        self.embedding_function = embedding_function
+        self.client = PersistentClient(path=path or Config.VECTOR_DB_PATH)
+        try:
+            self.collection = self.client.get_collection(
+                Config.COLLECTION_NAME,
+                embedding_function=embedding_function
+            )
+        except ValueError:
+            if not create:
+                raise
+            self.collection = self._create_collection()
+        self._apply_hnsw_settings()
+
+    def _create_collection(self):
+        return self.client.create_collection(
+            name=Config.COLLECTION_NAME,
+            metadata=hnsw_metadata(),
+            embedding_function=self.embedding_function
+        )
+
+    def _apply_hnsw_settings(self):
+        built = self.hnsw_parameters()
+        wanted = hnsw_metadata()
+        different = [key[5:] for key in CHROMA_HNSW_DEFAULTS if built[key[5:]] != wanted[key]]
+        if different:
+            print(f"Collection {Config.COLLECTION_NAME} was built with different HNSW "
+                  f"{', '.join(different)} ({', '.join(f'{name}={built[name]}' for name in different)}); "
+                  f"the HNSW_* settings only apply once it is rebuilt (e.g. migrated out and back)")
+
+    def hnsw_parameters(self) -> Dict[str, Any]:
+        """The HNSW parameters the collection's index was created with (and still uses)."""
+        metadata = self.collection.metadata or {}
+        return {key[5:]: metadata.get(key, default) for key, default in CHROMA_HNSW_DEFAULTS.items()}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset,
+                                   include=list(include or ["documents", "metadatas"]))
+
+    def query(self, query_embeddings, n_results, where=None):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+    def clear(self):
+        self.client.delete_collection(Config.COLLECTION_NAME)
+        self.collection = self._create_collection()
+
+    def warm_up(self):
+        # Chroma reads the whole HNSW index into memory on the first query
+        page = self.collection.get(limit=1, include=["embeddings"])
+        if page["ids"]:
+            self.collection.query(query_embeddings=page["embeddings"], n_results=1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "chunks": self.count(),
+            "hnsw": self.hnsw_parameters()
+        }
+
+class NumpyVectorStore(VectorStore):
+    """Local vector store: float32 vectors in a memory-mapped file, chunks in SQLite.
+
+    Chunk IDs, documents, metadata and vector row numbers live in SQLite
+    (metadata filters run as json_extract queries). Vectors and their squared
+    norms are appended to flat files and scored with blocked matrix products.
+    With NUMPY_INDEX=ivf, rows are also assigned to k-means lists once there
+    are IVF_MIN_TRAIN_SIZE chunks, and a query only scores the IVF_PROBES
+    nearest lists. Replaced and deleted rows stay in the files until save()
+    finds too many of them and rewrites the files under a new generation;
+    the generation and row numbers change in one SQLite transaction, so
+    readers in other processes always see a consistent snapshot.
+    """
+
+    backend = "numpy"
+
+    def __init__(self, path: Optional[str] = None, index_type: Optional[str] = None):
+        self.path = path or Config.NUMPY_STORE_PATH
+        self.index_type = index_type or Config.NUMPY_INDEX
+        if self.index_type not in ("flat", "ivf"):
+            raise ValueError(f"Unsupported NUMPY_INDEX: {self.index_type}")
+        self.probes = max(1, Config.IVF_PROBES)
+        self._lock = threading.RLock()
+        os.makedirs(self.path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.path, "chunks.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, row INTEGER NOT NULL, list INTEGER NOT NULL DEFAULT -1, "
+            "document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """Read a consistent snapshot of the row table and open the vector files."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+                rows = self._conn.execute("SELECT id, row, list FROM chunks").fetchall()
+            finally:
+                self._conn.commit()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._generation = int(meta.get("generation", 0))
+            self._dim = int(meta.get("dim", 0))
+            self._ivf_version = int(meta.get("ivf_version", 0))
+            self._trained_size = int(meta.get("ivf_trained_size", 0))
+            self._count = max((row for _, row, _ in rows), default=-1) + 1
+            self._ids: List[Optional[str]] = [None] * self._count
+            self._alive = np.zeros(self._count, dtype=bool)
+            self._lists = np.full(self._count, -1, dtype=np.int32)
+            self._rows: Dict[str, int] = {}
+            for doc_id, row, list_id in rows:
+                self._ids[row] = doc_id
+                self._alive[row] = True
+                self._lists[row] = list_id
+                self._rows[doc_id] = row
+            self._centroids = None
+            if self._ivf_version:
+                self._centroids = np.load(self._file("centroids", self._ivf_version))
+            self._open_arrays()
+            self._dirty = False
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if not self._dim:
+                self._dim = vectors.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self._dim),))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self._dim}")
+            start = self._count
+            lists = self._assign(vectors) if self._centroids is not None else np.full(len(ids), -1, dtype=np.int32)
+            # Vectors are on disk before the rows that point at them are committed
+            self._append("vectors", vectors, start)
+            self._append("norms", (vectors * vectors).sum(axis=1), start)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, list, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [(doc_id, start + i, int(lists[i]), documents[i], json.dumps(metadatas[i] or {}))
+                 for i, doc_id in enumerate(ids)]
+            )
+            self._conn.commit()
+
+            self._count += len(ids)
+            self._ids.extend(ids)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._lists = np.concatenate([self._lists, lists.astype(np.int32)])
+            for i, doc_id in enumerate(ids):
+                previous = self._rows.get(doc_id)
+                if previous is not None:
+                    self._alive[previous] = False
+                self._rows[doc_id] = start + i
+            self._open_arrays()
+            self._dirty = True
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata or {}), doc_id) for doc_id, metadata in zip(ids, metadatas)]
+            )
+            self._conn.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = False
+            self._dirty = True
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        include = list(include) if include is not None else ["documents", "metadatas"]
+        clauses, params = [], []
+        if where:
+            clause, where_params = _where_sql(where)
+            clauses.append(clause)
+            params.extend(where_params)
+
+        with self._lock:
+            if ids is not None:
+                found = []
+                for start in range(0, len(ids), _SQL_BATCH):
+                    batch = ids[start:start + _SQL_BATCH]
+                    found.extend(self._select(clauses + [f"id IN ({','.join('?' * len(batch))})"],
+                                              params + list(batch)))
+                found = found[offset or 0:][:limit] if limit is not None else found[offset or 0:]
+            else:
+                found = self._select(clauses, params, limit, offset)
+            embeddings = None
+            if "embeddings" in include:
+                rows = np.array([row for _, row, _, _ in found], dtype=np.int64)
+                embeddings = self._vectors_at(rows).tolist() if len(rows) else []
+
+        return {
+            "ids": [doc_id for doc_id, _, _, _ in found],
+            "documents": [doc for _, _, doc, _ in found] if "documents" in include else None,
+            "metadatas": [json.loads(meta) for _, _, _, meta in found] if "metadatas" in include else None,
+            "embeddings": embeddings
+        }
+
+    def query(self, query_embeddings, n_results, where=None):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": None}
+        with self._lock:
+            mask = self._alive.copy()
+            if where:
+                clause, params = _where_sql(where)
+                allowed = np.array([row for row, in self._conn.execute(
+                    f"SELECT row FROM chunks WHERE {clause}", params)], dtype=np.int64)
+                mask[:] = False
+                mask[allowed[allowed < self._count]] = True
+            # A selective filter leaves fewer rows per IVF list, so probe proportionally more lists
+            probes = self.probes
+            if where and self._centroids is not None:
+                probes = math.ceil(probes * max(1, len(self._rows)) / max(1, int(mask.sum())))
+            hits = [self._search(query, mask, n_results, probes) for query in queries]
+            wanted = list({self._ids[row] for rows, _ in hits for row in rows})
+            found = self.get(ids=wanted)
+
+        records = {doc_id: (doc, meta) for doc_id, doc, meta
+                   in zip(found["ids"], found["documents"], found["metadatas"])}
+        for rows, distances in hits:
+            # Rows deleted by another process since the last reload are skipped
+            kept = [(self._ids[row], float(distance)) for row, distance in zip(rows, distances)
+                    if self._ids[row] in records]
+            results["ids"].append([doc_id for doc_id, _ in kept])
+            results["documents"].append([records[doc_id][0] for doc_id, _ in kept])
+            results["metadatas"].append([records[doc_id][1] for doc_id, _ in kept])
+            results["distances"].append([distance for _, distance in kept])
+        return results
+
+    def _search(self, query: np.ndarray, mask: np.ndarray, n_results: int,
+                probes: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest rows among those set in mask, with their squared L2 distances."""
+        if self._centroids is not None:
+            # Only score the rows of the lists nearest to the query
+            centroid_distances = ((self._centroids - query) ** 2).sum(axis=1)
+            nearest_lists = np.argsort(centroid_distances)[:probes]
+            candidates = np.flatnonzero(mask & np.isin(self._lists, nearest_lists))
+            if len(candidates) < n_results:
+                candidates = np.flatnonzero(mask)
+        else:
+            candidates = np.flatnonzero(mask)
+        if not len(candidates) or n_results <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_distances = np.zeros(0, dtype=np.float32)
+        query_norm = float(query @ query)
+        for start in range(0, len(candidates), SEARCH_BLOCK_ROWS):
+            rows = candidates[start:start + SEARCH_BLOCK_ROWS]
+            if rows[-1] - rows[0] + 1 == len(rows):
+                # Contiguous rows are a slice of the memory map, not a gather
+                vectors = self._vectors[rows[0]:rows[-1] + 1]
+                norms = self._norms[rows[0]:rows[-1] + 1]
+            else:
+                vectors, norms = self._vectors[rows], self._norms[rows]
+            distances = norms - 2 * (vectors @ query) + query_norm
+            best_rows = np.concatenate([best_rows, rows])
+            best_distances = np.concatenate([best_distances, distances])
+            if len(best_rows) > n_results:
+                top = np.argpartition(best_distances, n_results - 1)[:n_results]
+                best_rows, best_distances = best_rows[top], best_distances[top]
+        order = np.argsort(best_distances, kind="stable")
+        return best_rows[order], np.maximum(best_distances[order], 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM meta WHERE key IN ('dim', 'ivf_version', 'ivf_trained_size')")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(self._generation + 1),))
+            self._conn.commit()
+            self._load()
+            self._dirty = True
+
+    def save(self) -> bool:
+        """Compact the vector files and (re)train the IVF lists when due."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            live = len(self._rows)
+            if self._count and live < 0.75 * self._count:
+                self._compact()
+            if self.index_type == "ivf" and live >= Config.IVF_MIN_TRAIN_SIZE and (
+                    self._centroids is None or live >= 4 * self._trained_size):
+                self._train_ivf()
+            self._remove_old_files()
+            self._dirty = False
+            return True
+
+    def reload_if_changed(self) -> bool:
+        with self._lock:
+            if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+                return False
+            self._load()
+            return True
+
+    def warm_up(self):
+        # Touch every page of the vector files so the first scans do not fault them in
+        with self._lock:
+            for start in range(0, self._count, SEARCH_BLOCK_ROWS):
+                float(self._vectors[start:start + SEARCH_BLOCK_ROWS].sum())
+            float(self._norms.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "index": "ivf" if self._centroids is not None else "flat",
+                "chunks": len(self._rows),
+                "dead_rows": self._count - len(self._rows),
+                "ivf_lists": len(self._centroids) if self._centroids is not None else None,
+                "ivf_probes": self.probes if self._centroids is not None else None
+            }
+
+    def _select(self, clauses: List[str], params: List[Any], limit: Optional[int] = None,
+                offset: Optional[int] = None) -> List[Tuple[str, int, str, str]]:
+        sql = "SELECT id, row, document, metadata FROM chunks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(f"({clause})" for clause in clauses)
+        sql += " ORDER BY rowid"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [-1 if limit is None else limit, offset or 0]
+        return self._conn.execute(sql, params).fetchall()
+
+    def _vectors_at(self, rows: np.ndarray) -> np.ndarray:
+        if len(rows) and rows.max() >= self._count:
+            # Rows written by another process since the last reload
+            self._load()
+        order = np.argsort(rows)
+        vectors = np.empty((len(rows), self._dim), dtype=np.float32)
+        vectors[order] = self._vectors[rows[order]]
+        return vectors
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest IVF list of each vector."""
+        centroid_norms = (self._centroids * self._centroids).sum(axis=1)
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 4096):
+            block = np.asarray(vectors[start:start + 4096], dtype=np.float32)
+            lists[start:start + 4096] = np.argmin(centroid_norms - 2 * (block @ self._centroids.T), axis=1)
+        return lists
+
+    def _train_ivf(self, iterations: int = 10):
+        """k-means on a sample of live vectors, then assign every row to its nearest list."""
+        live_rows = np.flatnonzero(self._alive)
+        n_lists = Config.IVF_LISTS or int(4 * math.sqrt(len(live_rows)))
+        n_lists = max(1, min(n_lists, len(live_rows) // 39))
+        print(f"Training IVF index with {n_lists} lists on {len(live_rows)} vectors...")
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(live_rows, min(len(live_rows), n_lists * 64), replace=False))
+        sample = np.asarray(self._vectors[sample_rows])
+        self._centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(sample)
+            sizes = np.bincount(assignment, minlength=n_lists)
+            used = np.flatnonzero(sizes)
+            starts = (np.cumsum(sizes) - sizes)[used]
+            sums = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts, axis=0)
+            self._centroids[used] = sums / sizes[used, None]
+            empty = sizes == 0
+            # Reseed empty lists with random sample points
+            self._centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+        lists = np.full(self._count, -1, dtype=np.int32)
+        for start in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+            rows = live_rows[start:start + SEARCH_BLOCK_ROWS]
+            lists[rows] = self._assign(self._vectors[rows])
+        version = self._ivf_version + 1
+        tmp_path = f"{self._file('centroids', version)}.tmp.npy"
+        np.save(tmp_path, self._centroids)
+        os.replace(tmp_path, self._file("centroids", version))
+        self._conn.executemany("UPDATE chunks SET list = ? WHERE id = ?",
+                               [(int(lists[row]), self._ids[row]) for row in live_rows])
+        self._conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                               [("ivf_version", str(version)), ("ivf_trained_size", str(len(live_rows)))])
+        self._conn.commit()
+        self._lists = lists
+        self._ivf_version = version
+        self._trained_size = len(live_rows)
+
+    def _compact(self):
+        """Rewrite live rows into vector files of the next generation."""
+        live_rows = np.flatnonzero(self._alive)
+        generation = self._generation + 1
+        for name, source in (("vectors", self._vectors), ("norms", self._norms)):
+            with open(self._file(name, generation), "wb") as f:
+                for start in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(source[live_rows[start:start + SEARCH_BLOCK_ROWS]]).tobytes())
+        self._conn.executemany("UPDATE chunks SET row = ? WHERE id = ?",
+                               [(i, self._ids[row]) for i, row in enumerate(live_rows)])
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(generation),))
+        self._conn.commit()
+        self._load()
+
+    def _remove_old_files(self):
+        # Keep the previous generation: a reader may still be switching over
+        for name in os.listdir(self.path):
+            parts = name.split(".")
+            if len(parts) != 3 or not parts[1].isdigit():
+                continue
+            current = self._ivf_version if parts[0] == "centroids" else self._generation
+            if int(parts[1]) < current - 1:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def _file(self, name: str, version: Optional[int] = None) -> str:
+        version = self._generation if version is None else version
+        suffix = "npy" if name == "centroids" else "f32"
+        return os.path.join(self.path, f"{name}.{version}.{suffix}")
+
+    def _append(self, name: str, array: np.ndarray, start: int):
+        # Overwrites whatever an interrupted run left past the last committed row
+        path = self._file(name)
+        row_bytes = array.nbytes // len(array)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            f.seek(start * row_bytes)
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate()
+
+    def _open_arrays(self):
+        if not self._count:
+            self._vectors = np.zeros((0, self._dim), dtype=np.float32)
+            self._norms = np.zeros(0, dtype=np.float32)
+            return
+        self._vectors = np.memmap(self._file("vectors"), dtype=np.float32, mode="r",
+                                  shape=(self._count, self._dim))
+        self._norms = np.memmap(self._file("norms"), dtype=np.float32, mode="r", shape=(self._count,))
+
+def hnsw_metadata() -> Dict[str, Any]:
+    """Chroma collection metadata for the configured HNSW parameters."""
+    return {
+        "hnsw:space": Config.HNSW_SPACE,
+        "hnsw:M": Config.HNSW_M,
+        "hnsw:construction_ef": Config.HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": Config.HNSW_SEARCH_EF
+    }
+
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+def _where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma metadata filter into an SQL condition on the JSON metadata column."""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(sub) for sub in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(f"({sql})" for sql, _ in parts) + ")")
+            for _, sub_params in parts:
+                params.extend(sub_params)
+            continue
+        column = "json_extract(metadata, ?)"
+        path = '$."' + key.replace('"', '\\"') + '"'
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in _SQL_OPERATORS:
+                clauses.append(f"{column} {_SQL_OPERATORS[op]} ?")
+                params.extend([path, value])
+            elif op in ("$in", "$nin"):
+                values = list(value)
+                negate = "NOT " if op == "$nin" else ""
+                clauses.append(f"{column} {negate}IN ({','.join('?' * len(values))})" if values
+                               else ("1" if negate else "0"))
+                if values:
+                    params.extend([path] + values)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+def create_vector_store(backend: Optional[str] = None, embedding_function=None,
+                        create: bool = True) -> VectorStore:
+    """Open the vector store selected by Config.VECTOR_STORE."""
+    backend = backend or Config.VECTOR_STORE
+    if backend == "numpy":
+        return NumpyVectorStore()
+    if backend == "chroma":
+        return ChromaVectorStore(embedding_function, create=create)
+    raise ValueError(f"Unknown vector store backend: {backend} (expected one of {', '.join(STORE_BACKENDS)})")
+
+def migrate(source: VectorStore, target: VectorStore, page_size: int = 1000, force: bool = False) -> int:
+    """Replace the target's contents with every chunk (and its embedding) from the source.
+
+    Refuses (ValueError) to overwrite a target that already holds chunks
+    unless force is set.
+    """
+    existing = target.count()
+    if existing and not force:
+        raise ValueError(f"Target {target.backend} store already holds {existing} chunks; "
+                         f"pass force=True (--force) to replace them")
+    target.clear()
+    copied = 0
+    while True:
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=copied)
+        if not page["ids"]:
+            break
+        target.upsert(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        copied += len(page["ids"])
+        print(f"Copied {copied} chunks...")
+    target.save()
+    return copied
+
+def main():
+    """Copy the index between vector store backends."""
+    parser = argparse.ArgumentParser(description="Migrate chunks and embeddings between vector store backends.")
+    parser.add_argument("--from", dest="source", choices=STORE_BACKENDS, required=True)
+    parser.add_argument("--to", dest="target", choices=STORE_BACKENDS, required=True)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--force", action="store_true", help="Replace the target's existing chunks")
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("--from and --to must differ")
+
+    try:
+        copied = migrate(create_vector_store(args.source), create_vector_store(args.target),
+                         page_size=args.page_size, force=args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Migrated {copied} chunks from {args.source} to {args.target}. "
+          f"Set VECTOR_STORE={args.target} to use it.")
+
+if __name__ == "__main__":
+    main()